@@ -12,6 +12,28 @@ class observable:
     raise_error = False
     # log as soon as it happens
     log_error_early = False
+    # how values are delivered: 'timeout', 'microtask', 'animation_frame',
+    # 'immediate' ('trampoline') or a Scheduler instance
+    scheduler = 'timeout'
+    # fuse consecutive stateless operators (map, filter, ...) in one stage
+    fuse = True
+    # values pulled at once by sources like from_ and range
+    chunk_size = 256
+    # values kept per input by zip while waiting for the other inputs. The
+    # oldest are discarded beyond it
+    zip_max_queue = 1024
+    # combined observables (combine_latest, obs1 == obs2, ...) recompute once
+    # per change, after all their inputs have been updated
+    glitch_free = True
+
+
+class timer:
+    # max callbacks from call_soon run in a single drain. The rest is run
+    # after a timeout, to let the browser render and handle input
+    call_soon_max = 1000
+    # milliseconds. call_delayed callbacks with deadlines in the same slot
+    # are executed together by a single host timer
+    resolution = 4
 
 
 class router:
@@ -241,15 +241,17 @@ class SuperchargedNode(object, metaclass=_MetaElement):
         sargs = self._sargs[key]
         for i, sarg in enumerate(fargs, len(sargs)):
             if isinstance(sarg, Observable):
+                # slot in place, values may be delivered during subscription
+                sargs.append('')
                 kw = {'who': self, 'fetch': True}
                 # default ref=i to freeze param in lambda during loop
                 v = sarg.subscribe(lambda x, ref=i: self(x, key, ref), **kw)
                 try:
                     v = v.get_val()
                 except AttributeError:
-                    v = ''
+                    v = sargs[i]
 
-                sargs.append(v)
+                sargs[i] = v
             else:
                 sargs.append(sarg)
 
@@ -261,7 +263,7 @@ class SuperchargedNode(object, metaclass=_MetaElement):
                 try:
                     v = v.get_val()
                 except AttributeError:
-                    v = ''
+                    v = kargs.get(name, '')
 
                 kargs[name] = v
             else:
@@ -3,11 +3,14 @@
 # Use of this source code is governed by an MIT-style license that
 # can be found in the LICENSE file at http://anpylar.com/mit-license
 ###############################################################################
-from browser import ajax
-from .observable import ObservableSource
+from browser import ajax, window
+from .observable import ObservableSource, exponential
+from .observable_scheduler import get_scheduler
 from .localdata import LocalData
+from .timer import call_delayed, call_cancel
+from .utils import ringbuffer
 
-__all__ = ['Http', 'HttpException']
+__all__ = ['Http', 'HttpException', 'WebSocket', 'ServerEvents']
 
 
 class HttpException(Exception):
@@ -32,10 +35,12 @@ class HttpRequest(ObservableSource):
         self._data = data
         self._sid = None
         self._fullresp = fullresp
+        self._reqs = {}  # sid -> in-flight request
 
     def _subscribed(self, sid, **kwargs):
         self._sid = sid
         self._req = req = ajax.ajax()
+        self._reqs[sid] = req
         req.bind('complete', lambda r: self._complete_handler(r, sid))
         req.open(self._method, self._url, True)  # True for async
         if self._headers:
@@ -47,11 +52,21 @@ class HttpRequest(ObservableSource):
         else:
             req.send()
 
+    def _unsubscribed(self, sid):
+        # nobody is waiting for the result, abort it if still in flight
+        req = self._reqs.pop(sid, None)
+        if req is not None:
+            req.abort()
+
     def cancel(self):
+        self._reqs.pop(self._sid, None)
         self._req.abort()
         self.on_error(False, self._sid)
 
     def _complete_handler(self, resp, sid):
+        if self._reqs.pop(sid, None) is None:
+            return  # aborted
+
         if self._fullresp:
             if resp.status:
                 self.on_next(resp, sid)
@@ -96,6 +111,309 @@ class HttpRequestLocalData(ObservableSource):
         self.on_next(response, sid)
 
 
+class WebSocket(ObservableSource):
+    '''
+    An observable over a *WebSocket* connection to ``url`` (with optional
+    ``protocols``). The incoming messages are generated as values and
+    multicasted to all subscribers.
+
+    The connection is opened with the first subscription and closed when the
+    last subscription is gone. ``close`` closes it and completes the
+    subscribers
+
+      - ``reconnect`` (default: ``True``): if the connection is lost, it is
+        opened again after the delay returned by ``backoff(n)``, where ``n``
+        is the number of the retry (default: ``exponential()``)
+
+        If ``False``, the subscribers are completed (or receive the close
+        event as error if the connection was not cleanly closed)
+
+      - ``batch`` (default: ``False``): deliver the messages received during
+        an animation frame together as a list, once per frame
+
+      - ``binary_type`` (default: ``'arraybuffer'``): binary messages are
+        delivered as *ArrayBuffer* (or *Blob* with ``'blob'``) and are not
+        converted to strings
+
+    Messages sent with ``send`` while the connection is not open are kept
+    (at most ``max_buffer`` if not ``None``, the oldest ones are dropped) and
+    sent when it opens. After ``close`` (or the end of the connection
+    without ``reconnect``) they are discarded until a new subscription
+    opens the connection again.
+    '''
+    def __init__(self, url, protocols=None, reconnect=True, backoff=None,
+                 batch=False, binary_type='arraybuffer', max_buffer=None):
+        self._url = url
+        self._protocols = protocols
+        self._reconnect = reconnect
+        self._backoff = backoff if backoff is not None else exponential()
+        self._batch = [] if batch else None  # messages waiting for a frame
+        self._binary_type = binary_type
+        self._outbox = ringbuffer(maxlen=max_buffer)
+        self._ws = None
+        self._timer = None  # to reconnect
+        self._retries = 0
+        self._done = False  # closed, do not keep messages for sending
+
+    def _subscribed(self, sid, **kwargs):
+        self._error = None  # it may be a reconnection after an error
+        self._done = False
+        if self._ws is None and self._timer is None:
+            self._connect()
+
+    def _unsubscribed(self, sid):
+        if not self._sids:  # last one gone
+            self._disconnect()
+
+    def _connect(self):
+        self._timer = None
+        if self._protocols is None:
+            ws = window.WebSocket.new(self._url)
+        else:
+            ws = window.WebSocket.new(self._url, self._protocols)
+
+        ws.binaryType = self._binary_type
+        ws.onopen = lambda evt: self._opened(ws)
+        ws.onmessage = lambda evt: self._message(ws, evt.data)
+        ws.onclose = lambda evt: self._closed(ws, evt)
+        self._ws = ws
+
+    def _opened(self, ws):
+        if ws is not self._ws:
+            return  # closed meanwhile
+
+        self._retries = 0
+        outbox = self._outbox
+        while outbox:
+            ws.send(outbox.popleft())
+
+    def _message(self, ws, data):
+        if ws is not self._ws:
+            return
+
+        batch = self._batch
+        if batch is None:
+            self.on_next(data)
+            return
+
+        if not batch:  # first in this frame
+            get_scheduler('animation_frame').schedule(self._flush)
+
+        batch.append(data)
+
+    def _flush(self):
+        batch, self._batch = self._batch, []
+        if batch:
+            self.on_next(batch)
+
+    def _closed(self, ws, evt):
+        if ws is not self._ws:
+            return  # closed by us
+
+        self._ws = None
+        if not self._sids:
+            return
+
+        if self._reconnect:
+            tout = self._backoff(self._retries)
+            self._retries += 1
+            self._timer = call_delayed(tout, self._connect)
+            return
+
+        self._finish()
+        if evt.wasClean:
+            self.on_completed(None)
+        else:
+            self.on_error(evt, None)
+
+    def send(self, data):
+        '''
+        Send ``data`` (a string or binary data) or keep it until the connection
+        is open
+        '''
+        ws = self._ws
+        if ws is not None and ws.readyState == 1:  # OPEN
+            ws.send(data)
+        elif not self._done:
+            self._outbox.append(data)
+
+    def _disconnect(self):
+        if self._timer is not None:
+            call_cancel(self._timer)
+            self._timer = None
+
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            ws.close()
+
+    def _finish(self):
+        # deliver what is waiting for a frame, nothing else will be sent
+        self._done = True
+        self._outbox.clear()
+        if self._batch:
+            self._flush()
+
+    def close(self):
+        '''Close the connection and complete all subscribers'''
+        self._disconnect()
+        self._finish()
+        self.on_completed(None)
+
+
+class _ServerEventsType(ObservableSource):
+    '''
+    Generates the data of the events of type ``evt`` received by ``owner``
+    (a ``ServerEvents``). See ``ServerEvents.on``
+    '''
+    def __init__(self, owner, evt):
+        self._owner = owner
+        self._evt = evt
+
+    def _subscribed(self, sid, **kwargs):
+        self._error = None  # it may be a subscription after an error
+        self._owner._ref()
+
+    def _unsubscribed(self, sid):
+        self._owner._unref()
+
+    def _streams_error(self, error, sid):
+        # an error ends the stream without unsubscribing it
+        ended = sid in self._sids
+        super()._streams_error(error, sid)
+        if ended and sid not in self._sids:
+            self._owner._unref()
+
+
+class ServerEvents(_ServerEventsType):
+    '''
+    An observable over a *Server-Sent Events* (*EventSource*) connection to
+    ``url``, generating the data of the unnamed (``message``) events.
+    Values are multicasted to all subscribers.
+
+    The observables for named events are returned by ``on(evt)``. All of them
+    share the connection, which is opened with the first subscription and
+    closed when the last subscription (to any of them) is gone.
+
+      - ``with_credentials``: send cookies to other origins
+
+      - ``parse``: if not ``None``, it is applied to the data of the events,
+        for example ``json.loads``. If it fails, the error ends the
+        subscriptions to the observable of the event type
+
+      - ``backoff``: delay for ``backoff(n)`` milliseconds before opening a
+        connection closed by the browser (which retries by itself only for
+        dropped connections) for the retry ``n`` (default:
+        ``exponential()``)
+
+      - ``last_id_param``: when opening a connection again, the id of the
+        last event is sent in this query parameter, for the server to resume
+        from there (the browser uses the *Last-Event-ID* header when it
+        retries by itself). ``None`` to disable
+    '''
+    def __init__(self, url, with_credentials=False, parse=None,
+                 backoff=None, last_id_param='lastEventId'):
+        super().__init__(self, 'message')
+        self._url = url
+        self._with_credentials = with_credentials
+        self._parse = parse
+        self._backoff = backoff if backoff is not None else exponential()
+        self._last_id_param = last_id_param
+        self._types = {'message': self}  # event type -> observable
+        self._refs = 0  # subscriptions to self and the named events
+        self._es = None
+        self._timer = None  # to reconnect
+        self._retries = 0
+        self._last_id = None
+
+    def on(self, evt):
+        '''Returns the observable for the events of type ``evt``'''
+        obs = self._types.get(evt)
+        if obs is None:
+            self._types[evt] = obs = _ServerEventsType(self, evt)
+            if self._es is not None:
+                self._listen(self._es, evt)
+
+        return obs
+
+    def _ref(self):
+        self._refs += 1
+        if self._refs == 1:
+            self._connect()
+
+    def _unref(self):
+        if self._refs:  # close() may have reset it
+            self._refs -= 1
+            if not self._refs:
+                self._disconnect()
+
+    def _connect(self):
+        self._timer = None
+        url = self._url
+        if self._last_id and self._last_id_param:
+            url += '{}{}={}'.format('&' if '?' in url else '?',
+                                    self._last_id_param,
+                                    window.encodeURIComponent(self._last_id))
+
+        es = window.EventSource.new(
+            url, {'withCredentials': self._with_credentials})
+        es.onopen = lambda evt: self._opened(es)
+        es.onerror = lambda evt: self._failed(es)
+        for evt in self._types:
+            self._listen(es, evt)
+
+        self._es = es
+
+    def _listen(self, es, evt):
+        es.addEventListener(evt, lambda e: self._received(es, evt, e))
+
+    def _opened(self, es):
+        if es is self._es:
+            self._retries = 0
+
+    def _received(self, es, evt, e):
+        if es is not self._es:
+            return  # closed meanwhile
+
+        if e.lastEventId:
+            self._last_id = e.lastEventId
+
+        data = e.data
+        if self._parse is not None:
+            try:
+                data = self._parse(data)
+            except Exception as exc:
+                self._types[evt].on_error(exc, None)
+                return
+
+        self._types[evt].on_next(data)
+
+    def _failed(self, es):
+        if es is not self._es or es.readyState != 2:  # 2: CLOSED
+            return  # closed by us or the browser is retrying
+
+        self._es = None
+        es.close()
+        tout = self._backoff(self._retries)
+        self._retries += 1
+        self._timer = call_delayed(tout, self._connect)
+
+    def _disconnect(self):
+        if self._timer is not None:
+            call_cancel(self._timer)
+            self._timer = None
+
+        es, self._es = self._es, None
+        if es is not None:
+            es.close()
+
+    def close(self):
+        '''Close the connection and complete all subscribers'''
+        self._disconnect()
+        self._refs = 0
+        for obs in self._types.values():
+            obs.on_completed(None)
+
+
 class Http:
     _RequestClass = HttpRequest
     _LocalData = {}
@@ -147,3 +465,13 @@ class Http:
 
     def delete(self, url='', headers=None, data=None):
         return self._send('DELETE', url, headers, data)
+
+    def events(self, url='', **kwargs):
+        '''
+        Returns a ``ServerEvents`` observable for ``url``. See it for the
+        keyword arguments
+        '''
+        if self.url:
+            url = '/'.join((self.url, url)) if url else self.url
+
+        return ServerEvents(url, **kwargs)
@@ -6,12 +6,21 @@
 from .observable_base import (Observable, _MetaObservable, Disposable,
                               ObservableStopError, ObservableFetchError,
                               ObservableSource, ObservableOperator)
+from .observable_scheduler import (Scheduler, ImmediateScheduler,
+                                   MicrotaskScheduler, AnimationFrameScheduler,
+                                   TimeoutScheduler)
+from .observable_subject import Subject, BehaviorSubject, ReplaySubject
+from .observable_operators import exponential
 
 from . import observable_sources
 from . import observable_operators
 from . import observable_promise
+from . import observable_browser
 
 
 __all__ = ['Observable', '_MetaObservable', 'Disposable',
            'ObservableStopError', 'ObservableFetchError',
-           'ObservableSource', 'ObservableOperator']
+           'ObservableSource', 'ObservableOperator',
+           'Scheduler', 'ImmediateScheduler', 'MicrotaskScheduler',
+           'AnimationFrameScheduler', 'TimeoutScheduler',
+           'Subject', 'BehaviorSubject', 'ReplaySubject', 'exponential']
@@ -4,7 +4,8 @@
 # can be found in the LICENSE file at http://anpylar.com/mit-license
 ###############################################################################
 from . import config as aconfig
-from .timer import call_soon, call_delayed, call_cancel
+from .timer import call_soon
+from .observable_scheduler import get_scheduler
 
 from .utils import defaultdict
 
@@ -75,17 +76,20 @@ class Subscription:
     def _operate(self, val, sid):
         return val
 
+    def _listening(self, sid):
+        return not self._error
+
     def on_next(self, val, sid):
-        if not self._error and self._on_next:
+        if not self._error and self._on_next is not None:
             self._on_next(val)
 
     def on_completed(self, sid):
-        if not self._error and self._on_completed:
+        if not self._error and self._on_completed is not None:
             self._on_completed()
 
     def on_error(self, error, sid):
         self._error = error
-        if self._on_error:
+        if self._on_error is not None:
             self._on_error(error)
         else:
             if aconfig.observable.log_error is True:
@@ -97,16 +101,100 @@ class Subscription:
                 raise Exception(error)
 
 
+class _SidState:
+    '''
+    Holds the state of a stream (sid) in an Observable
+
+      - subs: the subscriptions for the stream
+      - in_next: deliveries scheduled or in progress
+      - to_complete: completion is pending, until deliveries are done
+      - to_unsubscribe: unsubscription is pending, until deliveries are done
+      - to_error: error is pending (in error), until deliveries are done
+      - finishing: the pending completion/unsubscription has been scheduled
+    '''
+    __slots__ = ('subs', 'in_next', 'to_complete', 'to_unsubscribe',
+                 'to_error', 'error', 'finishing')
+
+    def __init__(self):
+        self.subs = []
+        self.in_next = 0
+        self.to_complete = False
+        self.to_unsubscribe = False
+        self.to_error = False
+        self.error = None
+        self.finishing = False
+
+
+class _Propagation:
+    '''
+    Observables which combine several inputs mark themselves as *dirty* when
+    an input changes. They recompute once (glitch-free) when no delivery is
+    in progress in the observables they depend on and none of those is dirty
+    (topological order), instead of once per input and with a mix of old and
+    new values (diamond dependencies).
+
+    Deliveries in other, unrelated, observables do not delay them
+
+      - dirty: (id(obs), sid) -> (obs, sid) to recompute
+      - requested: a flush has been scheduled
+    '''
+
+    def __init__(self):
+        self.dirty = {}
+        self.requested = False
+
+    def begin(self, obs):
+        obs._hops += 1
+
+    def end(self, obs):
+        obs._hops -= 1
+        self._request()
+
+    def mark(self, obs, sid):
+        self.dirty[(id(obs), sid)] = (obs, sid)
+        self._request()
+
+    def settle(self, obs, sid):
+        # recompute now if dirty, for example before completing
+        entry = self.dirty.pop((id(obs), sid), None)
+        if entry is not None:
+            obs._propagate(sid)
+
+    def _request(self):
+        if self.dirty and not self.requested:
+            self.requested = True
+            call_soon(self._flush)
+
+    def _flush(self):
+        self.requested = False
+        # recomputing delivers values, which can make others dirty or let
+        # them be ready (synchronous delivery). Go on until none is ready
+        while True:
+            dirty = {k[0] for k in self.dirty}
+            ready = [k for k, (obs, sid) in self.dirty.items()
+                     if not any(o._hops or id(o) in dirty
+                                for o in obs._upstream())]
+            if not ready:
+                return
+
+            for k in ready:
+                entry = self.dirty.pop(k, None)
+                if entry is not None:
+                    entry[0]._propagate(entry[1])
+
+
+_propagation = _Propagation()
+
+
 class _MetaObservable(type):
     def __call__(cls, parent, *args, **kwargs):
         self = cls.__new__(cls, *args, **kwargs)  # create
 
         self._parent = parent
-        self._subscriptions = defaultdict(list)
-        self._in_next = defaultdict(int)
-        self._to_complete = defaultdict(bool)
-        self._to_unsubscribe = defaultdict(bool)
-        self._timers = {}
+        if parent is not None:  # inherit scheduling from the chain
+            self._scheduler = parent._scheduler
+
+        self._sids = {}  # sid -> _SidState, removed when the stream ends
 
         self._next = super(cls, self).on_next
 
@@ -129,10 +217,20 @@ class Observable(object, metaclass=_MetaObservable):
 
     _streamid = 1
     _error = None
+    # None: use the scheduler from the global config
+    _scheduler = None
 
     # indicator than recursive on_next timer would happen with delay_next
     _timed_op = False
 
+    # stateless operators (only _operate) can be fused with adjacent ones
+    _fusable = False
+
+    # deliveries in progress (see _Propagation) and the observables this one
+    # depends on (see _upstream)
+    _hops = 0
+    _ups = None
+
     def __getattr__(self, name):
         if not name.startswith('__'):
             try:
@@ -145,30 +243,83 @@ class Observable(object, metaclass=_MetaObservable):
 
     def _suboperate(self, val, sid):
         val = self._operate(val, sid)
-        for s in self._subscriptions[sid]:
-            val = s._suboperate(val, sid)
-            break  # do only for the 1st
+        st = self._sids.get(sid)
+        if st is not None and st.subs:
+            val = st.subs[0]._suboperate(val, sid)  # do only for the 1st
 
         return val
 
     def _operate(self, val, sid):
         return val
 
-    def _delay_next(self, sid, fn, tout=0):
-        if self._to_complete[sid] or self._to_unsubscribe[sid]:
+    def _listening(self, sid):
+        # whether values for the stream are still wanted downstream, to let
+        # sources stop producing before the unsubscription reaches them
+        st = self._sids.get(sid)
+        if st is None:
+            return True  # consumer with its own streams (share, to_promise)
+
+        if st.to_complete or st.to_unsubscribe or st.to_error:
+            return False
+
+        return any(s._listening(sid) for s in st.subs)
+
+    def _deps(self):
+        # the observables this one receives values from directly
+        return [] if self._parent is None else [self._parent]
+
+    def _upstream(self):
+        # all the observables this one depends on
+        if self._ups is None:
+            ups, seen, todo = [], set(), self._deps()
+            while todo:
+                obs = todo.pop()
+                if id(obs) not in seen:
+                    seen.add(id(obs))
+                    ups.append(obs)
+                    todo.extend(obs._deps())
+
+            self._ups = ups
+
+        return self._ups
+
+    def _propagate(self, sid):
+        # recompute after the inputs have changed (see _Propagation)
+        pass
+
+    def _get_scheduler(self):
+        return get_scheduler(self._scheduler or aconfig.observable.scheduler)
+
+    def _delay_next(self, sid, fn, tout=0, hop=False):
+        # hop: a delivery of on_next, which is part of the propagation of a
+        # change. It is never cancelled
+        st = self._sids.get(sid)
+        if st is None or st.to_complete or st.to_unsubscribe or st.to_error:
             return 0
 
         def cb():
-            self._in_next[sid] -= 1  # counter the effect of the +1 below
-            fn()
+            st.in_next -= 1  # counter the effect of the +1 below
+            try:
+                fn()
+            finally:
+                if hop:
+                    _propagation.end(self)
+
+            self._finish_pending(st, sid)
 
-        self._in_next[sid] += 1
-        return call_delayed(tout, cb)
+        st.in_next += 1
+        if hop:
+            _propagation.begin(self)
+
+        return self._get_scheduler().schedule(cb, tout)
 
     def _delay_stop(self, sid, t):
         # cancelling the +1 from above, because cb above wasn't called
-        self._in_next[sid] -= 1
-        call_cancel(t)
+        st = self._sids.get(sid)
+        if st is not None:
+            st.in_next -= 1
+
+        self._get_scheduler().cancel(t)
 
     @staticmethod
     def _get_sid():
@@ -189,7 +340,12 @@ class Observable(object, metaclass=_MetaObservable):
             return Disposable(sid=sid)
 
     def _subscribe(self, sub, sid, **kwargs):
-        self._subscriptions[sid].append(sub)
+        try:
+            self._sids[sid].subs.append(sub)
+        except KeyError:
+            self._sids[sid] = st = _SidState()
+            st.subs.append(sub)
+
         disp = self._substrigger(sid, **kwargs)
         disp._add_parent(self)
         return disp
@@ -223,32 +379,56 @@ class Observable(object, metaclass=_MetaObservable):
 
     def _unsubscribe(self, sid):
         if sid is None:
-            for sid in self._subscriptions:
+            for sid in self._sids:
                 call_soon(lambda sid=sid: self._unsubscribe(sid))
             return
 
-        if self._in_next[sid] > 0 or self._to_complete[sid]:
-            self._to_unsubscribe[sid] = True
+        st = self._sids.get(sid)
+        if st is not None and (st.in_next > 0 or st.to_complete):
+            st.to_unsubscribe = True
+            st.finishing = False
             return
 
-        self._to_unsubscribe[sid] = False
+        # safe pop as it could have completed meanwhile
+        self._sids.pop(sid, None)
+        self._unsubscribe_parent(sid)
+        self._unsubscribed(sid)
 
+    def _unsubscribe_parent(self, sid):
         if self._parent is not None:
             self._parent._unsubscribe(sid)
 
-        # safe pop as it could have completed meanwhile
-        self._subscriptions.pop(sid, None)
-        self._unsubscribed(sid)
-
     def on_next(self, val, sid=None):
         if sid is None:  # multicast
-            for sid in self._subscriptions:
-                self._delay_next(sid, lambda s=sid: self._streams_next(val, s))
+            self._multicast_next(val)
 
         elif self._timed_op:  # gone thru delay, don't delay again
             self._streams_next(val, sid)
         else:  # yield in case someone needs something
-            self._delay_next(sid, lambda: self._streams_next(val, sid))
+            self._delay_next(sid, lambda: self._streams_next(val, sid),
+                             hop=True)
+
+    def _multicast_next(self, val):
+        # copy: delivery may be synchronous and alter the subscriptions
+        sts = [(s, st) for s, st in self._sids.items()
+               if not (st.to_complete or st.to_unsubscribe or st.to_error)]
+        if not sts:
+            return
+
+        for s, st in sts:
+            st.in_next += 1  # completion waits for the delivery
+
+        def cb():
+            try:
+                for s, st in sts:
+                    st.in_next -= 1
+                    self._streams_next(val, s)
+            finally:
+                _propagation.end(self)
+
+        # a single delivery for all subscribers
+        _propagation.begin(self)
+        self._get_scheduler().schedule(cb)
 
     def _streams_next(self, val, sid):
         # The rationale to catch here the exceptions for on_error is that there
@@ -256,18 +436,35 @@ class Observable(object, metaclass=_MetaObservable):
         # because if an on_next fails, its partner on_error can be hier
         # directly called to complete the chain.
         # other subscriptions at this level are not affected, because the
-        self._in_next[sid] += 1
+        st = self._sids.get(sid)
+        if st is None:
+            return  # stream already ended
 
-        for s in self._subscriptions[sid]:
+        st.in_next += 1
+
+        for s in st.subs:
             try:
                 s.on_next(val, sid)
             except Exception as e:
                 s.on_error(e, sid)
 
-        self._in_next[sid] -= 1
-        if self._to_complete[sid]:
+        st.in_next -= 1
+        self._finish_pending(st, sid)
+
+    def _finish_pending(self, st, sid):
+        # Completion/unsubscription waiting for the deliveries, is scheduled by
+        # the last one
+        if st.in_next > 0 or st.finishing:
+            return
+
+        if st.to_error:
+            st.finishing = True
+            call_soon(lambda: self._streams_error(st.error, sid))
+        elif st.to_complete:
+            st.finishing = True
             call_soon(lambda: self._streams_completed(sid))
-        elif self._to_unsubscribe[sid]:
+        elif st.to_unsubscribe:
+            st.finishing = True
             call_soon(lambda: self._unsubscribe(sid))
 
     def on_completed(self, sid):
@@ -279,28 +476,32 @@ class Observable(object, metaclass=_MetaObservable):
 
     def _streams_completed(self, sid):
         if sid is None:
-            for sid in self._subscriptions:
+            for sid in self._sids:
                 call_soon(lambda s=sid: self._streams_completed(s))
             return
 
+        st = self._sids.get(sid)
+        if st is None:
+            return  # unsubscribed meanwhile
+
         # A completion can arrive before "next" has completed, because next may
         # be waiting on a timer. Mark it. It will be recalled at the end of
         # streams_next
-        if self._in_next[sid] > 0:
-            self._to_complete[sid] = True
+        if st.in_next > 0:
+            st.to_complete = True
+            st.finishing = False
             return
 
-        self._to_complete[sid] = False
-
         # if already here, a subclassed on_completed has not generated an
-        # exception and it is safe to pop the subscribtions for the given sid
-        for s in self._subscriptions.pop(sid):
+        # exception and it is safe to remove the state for the given sid
+        del self._sids[sid]
+        for s in st.subs:
             try:
                 s.on_completed(sid)
             except Exception as e:
                 s.on_error(e, sid)
 
-        if self._to_unsubscribe[sid]:
+        if st.to_unsubscribe:
             call_soon(lambda: self._unsubscribe(sid))
 
     def on_error(self, error, sid):
@@ -308,23 +509,39 @@ class Observable(object, metaclass=_MetaObservable):
             print('on_error:', self, '-', error)
 
         self._error = error
-        if sid is None:
-            for sid in self._subscriptions:
-                call_soon(lambda s=sid: self._streams_error(error, s))
+        sids = list(self._sids) if sid is None else [sid]
+        for sid in sids:
+            st = self._sids.get(sid)
+            if st is not None and not st.to_error:
+                # no more values, but the ones before the error are delivered
+                st.to_error = True
+                st.error = error
 
-        else:
-            call_soon(lambda: self._streams_error(error, sid))
+            call_soon(lambda s=sid: self._streams_error(error, s))
 
     def _streams_error(self, error, sid):
-        # Errors from above do not come out of band like it may happen with
-        # completion. If an error has happened higher in the hierarchy, on_next
-        # won't have been called or will have generated an exception, there is
-        # no need to wait for it then.
-
         # if already here, there was an error during on_next or on_completed
         # and the subscriptions will still be there (see above in
         # streams_completed)
-        for s in self._subscriptions.pop(sid):
+        st = self._sids.get(sid)
+        if st is None:
+            return  # stream already ended
+
+        # Values produced before the error may still be waiting for delivery.
+        # They go first. It will be recalled by the last one
+        if st.in_next > 0:
+            if not st.to_error:
+                st.to_error = True
+                st.error = error
+
+            st.finishing = False
+            return
+
+        if st.to_error:
+            error = st.error  # the first one
+
+        del self._sids[sid]
+        for s in st.subs:
             try:
                 s.on_error(error, sid)
             except Exception as e:
@@ -366,6 +583,16 @@ class _MetaObservableOperator(_MetaObservable):
             obsname = name[:-9].lower()
             Observable._dynamicmethods[obsname] = cls
 
+    def __call__(cls, parent, *args, **kwargs):
+        self = super().__call__(parent, *args, **kwargs)  # create
+
+        if self._fusable and parent._fusable and aconfig.observable.fuse:
+            # a new stage replaces both, leaving parent untouched for others
+            stages = parent._stages() + self._stages()
+            return _FusedOperator(parent._parent, stages)
+
+        return self
+
 
 class ObservableOperator(Observable, metaclass=_MetaObservableOperator):
 
@@ -377,6 +604,29 @@ class ObservableOperator(Observable, metaclass=_MetaObservableOperator):
 
         super().on_next(val, sid)
 
+    def _stages(self):
+        return [self._operate]
+
+
+class _FusedOperator(ObservableOperator):
+    '''
+    Runs the ``_operate`` of several consecutive stateless operators in a
+    single stage. A stage raising ``ObservableStopError`` stops the value
+    '''
+    _fusable = True
+
+    def __init__(self, stages):
+        self._ops = stages
+
+    def _stages(self):
+        return self._ops
+
+    def _operate(self, val, sid):
+        for op in self._ops:
+            val = op(val, sid)
+
+        return val
+
 
 class ObsOpSingle(ObservableOperator):
 
@@ -435,7 +685,7 @@ class ObsOp(ObservableOperator):
         other = self._other
         if isinstance(other, Observable):
             disp2 = other.subscribe(
-                lambda v, s: self._operate(v, sid, ix=1),
+                lambda v: self._other_next(v, sid),
                 fetch=fetch, **kwargs)
 
         else:
@@ -465,6 +715,56 @@ class ObsOp(ObservableOperator):
         vals[ix] = val
         return self._op(*vals)
 
+    def _deps(self):
+        deps = [self._parent]
+        if isinstance(self._other, Observable):
+            deps.append(self._other)
+
+        return deps
+
+    def on_next(self, val, sid):
+        if not aconfig.observable.glitch_free:
+            return super().on_next(val, sid)
+
+        self._vals[sid][0] = val
+        _propagation.mark(self, sid)  # recompute once for both values
+
+    def _other_next(self, val, sid):
+        if not aconfig.observable.glitch_free:
+            if self._subscribing:
+                return  # the fetched values are combined in subscribe
+
+            try:
+                val = self._operate(val, sid, ix=1)
+            except Exception as e:
+                self.on_error(e, sid)
+            else:
+                Observable.on_next(self, val, sid)
+
+            return
+
+        self._vals[sid][1] = val
+        _propagation.mark(self, sid)
+
+    def _propagate(self, sid):
+        if sid not in self._sids:
+            return  # stream already ended
+
+        try:
+            val = self._op(*self._vals[sid])
+        except Exception as e:
+            self.on_error(e, sid)
+        else:
+            Observable.on_next(self, val, sid)
+
+    def on_completed(self, sid):
+        _propagation.settle(self, sid)  # deliver a pending recomputation
+        self._vals.pop(sid, None)
+        super().on_completed(sid)
+
+    def _unsubscribed(self, sid):
+        self._vals.pop(sid, None)
+
 
 class _MetaObservableSource(_MetaObservable):
     def __init__(cls, name, bases, dct, **kwds):
@@ -475,6 +775,9 @@ class _MetaObservableSource(_MetaObservable):
             Observable._staticmethods[obsname] = (
                 lambda *a, **kw: cls(*a, **kw)
             )
+            # obs.name(*a, **kw) will also be possible as name(obs, *a, **kw)
+            if dct.get('_as_operator', False):
+                Observable._dynamicmethods[obsname] = cls
 
     def __call__(cls, *args, **kwargs):
         return super().__call__(None, *args, **kwargs)  # create
@@ -0,0 +1,155 @@
+###############################################################################
+# Copyright 2018 The AnPyLar Team. All Rights Reserved.
+# Use of this source code is governed by an MIT-style license that
+# can be found in the LICENSE file at http://anpylar.com/mit-license
+###############################################################################
+from .observable_base import ObservableSource
+from .observable_scheduler import get_scheduler
+
+
+__all__ = []
+
+
+class _EventHub:
+    '''
+    A single native listener for an event type on a target, which dispatches
+    the events to all subscriptions, grouped by delegation selector. The
+    listener is removed when the last subscription is gone
+    '''
+    _hubs = {}  # (id(target), evt, passive) -> _EventHub
+
+    @classmethod
+    def get(cls, target, evt, passive):
+        key = (id(target), evt, passive)
+        hub = cls._hubs.get(key)
+        if hub is None:
+            cls._hubs[key] = hub = cls(key, target, evt, passive)
+
+        return hub
+
+    def __init__(self, key, target, evt, passive):
+        self.key = key
+        self.target = target
+        self.evt = evt
+        self.options = {'passive': passive}
+        self.selectors = {}  # selector -> {subscription key: callable}
+        self.count = 0
+        # the same callable has to be used to add and remove the listener
+        self.handler = lambda e: self._dispatch(e)
+
+    def add(self, key, selector, cb):
+        if not self.count:
+            self.target.addEventListener(self.evt, self.handler, self.options)
+
+        self.selectors.setdefault(selector, {})[key] = cb
+        self.count += 1
+
+    def remove(self, key, selector):
+        subs = self.selectors.get(selector)
+        if not subs or subs.pop(key, None) is None:
+            return
+
+        if not subs:
+            del self.selectors[selector]
+
+        self.count -= 1
+        if not self.count:
+            self.target.removeEventListener(self.evt, self.handler,
+                                            self.options)
+            self._hubs.pop(self.key, None)
+
+    def _dispatch(self, e):
+        for selector, subs in list(self.selectors.items()):
+            if selector is not None and not self._matches(e, selector):
+                continue
+
+            for cb in list(subs.values()):  # cbs may unsubscribe
+                cb(e)
+
+    def _matches(self, e, selector):
+        # the element which matches has to be inside the target
+        closest = getattr(e.target, 'closest', None)  # text nodes have none
+        if closest is None:
+            return False
+
+        node = closest(selector)
+        if node is None:
+            return False
+
+        contains = getattr(self.target, 'contains', None)  # not in window
+        return contains is None or contains(node)
+
+
+class From_Event_Source(ObservableSource):
+    '''
+    Generates the events of type ``evt`` which happen in ``target`` (a DOM
+    node, ``document`` or ``window``)
+
+      - ``passive``: the listener is registered as passive, letting the
+        browser scroll without waiting for it. Recommended for high
+        frequency events like *scroll*, *touchmove* or *pointermove*
+
+      - ``delegate_selector``: only events which happened in (or inside of)
+        an element matching the CSS selector, inside ``target``, are
+        generated
+
+    A single native listener per target, event type and ``passive`` is used
+    for all subscriptions, regardless of selectors. It is removed when the
+    last subscription is gone.
+
+    .. note:: Events are delivered like any other value, i.e.: with the
+              configured scheduler. Calling ``preventDefault`` in the
+              subscriber requires ``passive=False`` and the ``immediate``
+              scheduler
+    '''
+    def __init__(self, target, evt, passive=False, delegate_selector=None):
+        self._target = target
+        self._evt = evt
+        self._passive = passive
+        self._selector = delegate_selector
+        self._hubs = {}  # sid -> _EventHub
+
+    def _subscribed(self, sid, **kwargs):
+        self._hubs[sid] = hub = _EventHub.get(self._target, self._evt,
+                                              self._passive)
+        hub.add((id(self), sid), self._selector,
+                lambda e: self.on_next(e, sid))
+
+    def _unsubscribed(self, sid):
+        hub = self._hubs.pop(sid, None)
+        if hub is not None:
+            hub.remove((id(self), sid), self._selector)
+
+
+class Animation_Frames_Source(ObservableSource):
+    '''
+    Generates the timestamp of each animation frame (*requestAnimationFrame*)
+    while subscribed.
+
+    All subscriptions (and ``on_frame``) are served by the single
+    ``animation_frame`` scheduler: one request per frame for all of them.
+
+    Values are delivered during the frame (``immediate`` scheduler, also for
+    the operators chained after it), where updating the DOM is cheapest
+    '''
+    _scheduler = 'immediate'
+
+    def __init__(self):
+        self._frames = {}  # sid -> task for the next frame
+
+    def _subscribed(self, sid, **kwargs):
+        self._request(sid)
+
+    def _request(self, sid):
+        sched = get_scheduler('animation_frame')
+        self._frames[sid] = sched.schedule(lambda: self._frame(sid))
+
+    def _frame(self, sid):
+        if sid in self._frames:
+            self._request(sid)
+            self.on_next(get_scheduler('animation_frame').frame_time, sid)
+
+    def _unsubscribed(self, sid):
+        task = self._frames.pop(sid, None)
+        if task is not None:
+            get_scheduler('animation_frame').cancel(task)
@@ -3,12 +3,38 @@
 # Use of this source code is governed by an MIT-style license that
 # can be found in the LICENSE file at http://anpylar.com/mit-license
 ###############################################################################
-from .observable_base import (ObservableOperator, _MetaObservableOperator,
-                              Disposable, ObservableStopError)
+from browser import window
 
-from .utils import defaultdict
+from .observable_base import (Observable, ObservableOperator,
+                              _MetaObservableOperator, Disposable,
+                              ObservableStopError)
+from .observable_scheduler import get_scheduler
+from .observable_sources import _Inputs, _NOVAL
+from .observable_subject import Subject
+from .timer import call_soon, now
 
-__all__ = []
+from .utils import defaultdict, deque, ringbuffer
+
+__all__ = ['exponential']
+
+
+def exponential(base=100, cap=30000, jitter=True):
+    '''
+    Returns a *backoff* for ``retry_when``. The delay for the retry number
+    ``n`` (starting at ``0``) is ``base * 2 ** n`` milliseconds, with
+    ``cap`` as maximum.
+
+    With ``jitter`` the delay is a random amount between ``0`` and the
+    calculated delay (*full jitter*), to keep the retries of many clients
+    from hitting the server at the same time
+    '''
+    def backoff(n):
+        ms = min(cap, base * 2 ** n)
+        if jitter:
+            ms *= window.Math.random()
+        return ms
+
+    return backoff
 
 
 class All_Operator(ObservableOperator):
@@ -30,6 +56,171 @@ class All_Operator(ObservableOperator):
         super().on_completed(sid)
 
 
+class Audit_Operator(ObservableOperator):
+    '''
+    When a value arrives, wait ``ms`` milliseconds and then forward the last
+    value received during that time.
+    '''
+    _timed_op = True
+
+    def __init__(self, ms):
+        self.tout = ms
+        self._last = {}  # sid -> last value received while waiting
+
+    def _audit(self, sid):
+        self._next(self._last.pop(sid), sid)
+
+    def on_next(self, val, sid):
+        if sid not in self._last:
+            if not self._delay_next(sid, lambda: self._audit(sid), self.tout):
+                return  # stream is ending
+
+        self._last[sid] = val
+
+
+class Buffer_Count_Operator(ObservableOperator):
+    '''
+    Gather ``count`` values and forward them as a list.
+
+    Values left when the observable completes are forwarded as a last
+    (shorter) list.
+    '''
+
+    def __init__(self, count):
+        self._count = count
+        self._bufs = {}  # sid -> list of gathered values
+
+    def on_next(self, val, sid):
+        buf = self._bufs.setdefault(sid, [])
+        buf.append(val)
+        if len(buf) >= self._count:
+            self._next(self._bufs.pop(sid), sid)
+
+    def on_completed(self, sid):
+        buf = self._bufs.pop(sid, None)
+        if buf:
+            self._next(buf, sid)
+
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._bufs.pop(sid, None)
+        super().on_error(error, sid)
+
+    def _unsubscribed(self, sid):
+        self._bufs.pop(sid, None)
+
+
+class Buffer_Time_Operator(ObservableOperator):
+    '''
+    Gather values and forward them as a list ``ms`` milliseconds after the
+    first value of the list arrived or, if ``max_size`` is given, as soon as
+    ``max_size`` values have been gathered.
+
+    Values left when the observable completes are forwarded as a last list.
+    '''
+    _timed_op = True
+
+    def __init__(self, ms, max_size=None):
+        self.tout = ms
+        self._max_size = max_size
+        self._bufs = {}  # sid -> list of gathered values
+        self._timers = {}  # sid -> timer to forward the list
+
+    def _expired(self, sid):
+        self._timers.pop(sid, None)  # executed, nothing to stop
+        self._flush(sid)
+
+    def _flush(self, sid):
+        self._stop(sid)
+        buf = self._bufs.pop(sid, None)
+        if buf:
+            self._next(buf, sid)
+
+    def _stop(self, sid):
+        t = self._timers.pop(sid, None)
+        if t:
+            self._delay_stop(sid, t)
+
+    def on_next(self, val, sid):
+        buf = self._bufs.get(sid)
+        if buf is None:  # 1st value of list, start the timer
+            self._bufs[sid] = buf = []
+            t = self._delay_next(sid, lambda: self._expired(sid), self.tout)
+            if t:
+                self._timers[sid] = t
+
+        buf.append(val)
+        if self._max_size and len(buf) >= self._max_size:
+            self._flush(sid)
+
+    def on_completed(self, sid):
+        self._flush(sid)
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._stop(sid)
+        self._bufs.pop(sid, None)
+        super().on_error(error, sid)
+
+    def _unsubscribe(self, sid):
+        if sid is not None:
+            self._stop(sid)
+            self._bufs.pop(sid, None)
+
+        super()._unsubscribe(sid)
+
+
+class Buffer_When_Operator(ObservableOperator):
+    '''
+    Gather values and forward them as a list each time ``notifier`` (an
+    *Observable*) generates a value.
+
+    Values left when the observable completes are forwarded as a last list.
+    '''
+    _timed_op = True
+
+    def __init__(self, notifier):
+        self._notifier = notifier
+        self._bufs = {}  # sid -> list of gathered values
+        self._nsids = {}  # sid -> sid of the notifier subscription
+
+    def _substrigger(self, sid, **kwargs):
+        disp = self._notifier.subscribe(lambda x: self._flush(sid))
+        self._nsids[sid] = disp.sid
+        return super()._substrigger(sid, **kwargs)
+
+    def _flush(self, sid):
+        buf = self._bufs.pop(sid, None)
+        if buf:
+            self._next(buf, sid)
+
+    def _stop(self, sid):
+        nsid = self._nsids.pop(sid, None)
+        if nsid is not None:
+            self._notifier._unsubscribe(nsid)
+
+    def on_next(self, val, sid):
+        self._bufs.setdefault(sid, []).append(val)
+
+    def on_completed(self, sid):
+        self._stop(sid)
+        self._flush(sid)
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._stop(sid)
+        self._bufs.pop(sid, None)
+        super().on_error(error, sid)
+
+    def _unsubscribe(self, sid):
+        if sid is not None:
+            self._stop(sid)
+            self._bufs.pop(sid, None)
+
+        super()._unsubscribe(sid)
+
+
 class Catch_Exception_Operator(ObservableOperator):
     '''
     Swicth to another observable if an error has been produced and ``on_error``
@@ -131,30 +322,78 @@ class Delay_Operator(ObservableOperator):
 
 class Distinct_Operator(ObservableOperator):
     '''
-    Let the value through if it has not been seen before. If ``predicate`` is
-    provided it will be used to assess if a value is distinct from previous
-    values
+    Let the value through if it has not been seen before.
+
+      - If ``key`` is provided, it will be called with the value and the
+        returned (hashable) key will be used to assess if the value has been
+        seen
 
-    .. note:: Use with care, because on long running observables, the buffer
-              will grow with no limits.
+      - If ``max_size`` is provided, only the ``max_size`` most recently seen
+        keys are remembered (*LRU*)
+
+      - If ``window_ms`` is provided, keys are forgotten if they have not
+        been seen in the last ``window_ms`` milliseconds
+
+    If ``predicate`` is provided it will be used to assess if a value is
+    distinct from previous values, comparing it to each of them. This is
+    *O(n)* for each value. Prefer ``key``
+
+    .. note:: Use with care, because on long running observables and without
+              ``max_size`` or ``window_ms``, the buffer will grow with no
+              limits.
     '''
 
-    def __init__(self, predicate=None):
+    def __init__(self, predicate=None, key=None, max_size=None,
+                 window_ms=None):
         self._fn = predicate
-        self._lookup = defaultdict(set)
+        self._key = key
+        self._max_size = max_size
+        self._window = window_ms
+        self._lookup = defaultdict(dict)  # sid -> {key: last seen}, ordered
 
     def _operate(self, val, sid):
+        seen = self._lookup[sid]
+        tstamp = None
+        if self._window is not None:
+            tstamp = now()
+            expired = tstamp - self._window
+            while seen:  # ordered by last seen, drop the expired ones
+                first = next(iter(seen))
+                if seen[first] > expired:
+                    break
+                del seen[first]
+
         fn = self._fn
-        if fn is None:
-            if val in self._lookup[sid]:
+        if fn is not None:
+            if any(fn(v, val) for v in seen):
                 raise ObservableStopError()
+            k = val
+        else:
+            k = val if self._key is None else self._key(val)
 
-        elif any(fn(v, val) for v in self._lookup[sid]):
+        if fn is None and k in seen:
+            if self._max_size is not None or tstamp is not None:
+                del seen[k]  # refresh position (lru) and timestamp
+                seen[k] = tstamp
             raise ObservableStopError()
 
-        self._lookup[sid].add(val)  # not found, add and progress
+        seen[k] = tstamp  # not found, add and progress
+        if self._max_size is not None and len(seen) > self._max_size:
+            del seen[next(iter(seen))]  # least recently seen
+
         return val
 
+    def on_completed(self, sid):
+        self._lookup.pop(sid, None)
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._lookup.pop(sid, None)
+        super().on_error(error, sid)
+
+    def _unsubscribed(self, sid):
+        self._lookup.pop(sid, None)
+
 
 class Distinct_Until_Changed_Operator(ObservableOperator):
     '''
@@ -182,6 +421,7 @@ class Do_Action_Operator(ObservableOperator):
 
     The value is forwarded as is, regardless of the actions of ``action``
     '''
+    _fusable = True
 
     def __init__(self, action):
         self._action = action
@@ -195,6 +435,7 @@ class Filter_Operator(ObservableOperator):
     '''
     Forward the value only if ``predicate`` evaluates the value to ``True``
     '''
+    _fusable = True
 
     def __init__(self, predicate):
         self._fn = predicate
@@ -249,10 +490,136 @@ class First_Or_Default_Operator(ObservableOperator):
             super().on_completed(sid)
 
 
+class _Group(Subject):
+    '''
+    The observable for a key in ``group_by``. Values pushed before the first
+    subscription are kept and delivered to it
+    '''
+
+    def __init__(self, key):
+        self.key = key
+        self._pending = []
+
+    def on_next(self, val, sid=None):
+        if self._pending is not None:
+            self._pending.append(val)
+        else:
+            super().on_next(val)
+
+    def _subscribed(self, sid, **kwargs):
+        pending, self._pending = self._pending, None
+        for val in pending or ():
+            Observable.on_next(self, val, sid)
+
+        super()._subscribed(sid, **kwargs)
+
+
+class _GroupByState:
+    '''
+    State of a stream in ``group_by``
+
+      - groups: key -> group, ordered by last activity when idle_ms is set
+      - seen: key -> timestamp of the last value
+      - timer: timer to evict idle groups
+    '''
+    __slots__ = ('groups', 'seen', 'timer')
+
+    def __init__(self):
+        self.groups = {}
+        self.seen = {}
+        self.timer = None
+
+
+class Group_By_Operator(ObservableOperator):
+    '''
+    Split the values in groups using the key returned by ``key_fn(val)``.
+    For each new key, an observable is forwarded, which produces the values
+    of the group. The key is available as its ``key`` attribute.
+
+    If ``idle_ms`` is given, groups which receive no values for ``idle_ms``
+    milliseconds are completed and forgotten. A later value with the same
+    key starts a new group.
+
+    Groups complete (or produce an error) with the observable
+    '''
+
+    def __init__(self, key_fn, idle_ms=None):
+        self._key_fn = key_fn
+        self._idle = idle_ms
+        self._states = {}  # sid -> _GroupByState
+
+    def on_next(self, val, sid):
+        st = self._states.get(sid)
+        if st is None:
+            self._states[sid] = st = _GroupByState()
+
+        key = self._key_fn(val)
+        group = st.groups.get(key)
+        if group is None:
+            st.groups[key] = group = _Group(key)
+            self._next(group, sid)
+
+        if self._idle is not None:
+            st.seen.pop(key, None)  # re-insert, keeps seen ordered by time
+            st.seen[key] = now()
+            if st.timer is None:
+                self._arm(st, sid, self._idle)
+
+        group.on_next(val)
+
+    def _arm(self, st, sid, tout):
+        st.timer = self._get_scheduler().schedule(
+            lambda: self._evict(sid), tout)
+
+    def _evict(self, sid):
+        st = self._states.get(sid)
+        if st is None:
+            return
+
+        st.timer = None
+        seen, tnow = st.seen, now()
+        while seen:
+            key = next(iter(seen))  # least recently active
+            tout = seen[key] + self._idle - tnow
+            if tout > 0:
+                self._arm(st, sid, tout)
+                break
+
+            del seen[key]
+            st.groups.pop(key).on_completed()
+
+    def _stop(self, sid, error=None):
+        st = self._states.pop(sid, None)
+        if st is None:
+            return
+
+        if st.timer is not None:
+            self._get_scheduler().cancel(st.timer)
+
+        for group in st.groups.values():
+            if error is None:
+                group.on_completed()
+            else:
+                group.on_error(error)
+
+    def on_completed(self, sid):
+        self._stop(sid)
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._stop(sid, error)
+        super().on_error(error, sid)
+
+    def _unsubscribed(self, sid):
+        self._stop(sid)
+
+
 class Map_Operator(ObservableOperator):
     '''
     Apply ``fn`` to the generated values generated, forwarding each result
     '''
+    _fusable = True
+
     def __init__(self, fn):
         self.fn = fn
 
@@ -260,11 +627,183 @@ class Map_Operator(ObservableOperator):
         return self.fn(val)
 
 
+class _MergeMapState:
+    '''
+    State of a stream in ``merge_map``
+
+      - inner: sid -> observable, for the subscribed mapped observables
+      - queue: values waiting to be mapped
+      - done: the observable has completed
+    '''
+    __slots__ = ('inner', 'queue', 'done')
+
+    def __init__(self):
+        self.inner = {}
+        self.queue = []
+        self.done = False
+
+
+class Merge_Map_Operator(ObservableOperator):
+    '''
+    Map each value to an observable and forward the values of all of them:
+
+      - If ``handler`` is an *Observable*, it will be used for each value
+
+      - Else, ``handler`` must be a callable accepting the value and returning
+        the observable to use
+
+        - If the return value is not an *Observable* it will be converted
+          using ``Observable.of``
+
+    At most ``concurrency`` (unlimited if ``None``) mapped observables are
+    subscribed at the same time. The values arriving meanwhile are queued and
+    mapped when a mapped observable completes.
+
+    It completes when the observable and all mapped observables have
+    completed
+    '''
+
+    def __init__(self, handler, concurrency=None):
+        if isinstance(handler, Observable):
+            self._obsgen = lambda x: handler
+        else:
+            self._obsgen = handler
+
+        self._concurrency = concurrency
+        self._states = {}  # sid -> _MergeMapState
+
+    def on_next(self, val, sid):
+        state = self._states.get(sid)
+        if state is None:
+            self._states[sid] = state = _MergeMapState()
+
+        if self._concurrency and len(state.inner) >= self._concurrency:
+            state.queue.append(val)
+        else:
+            self._subinner(state, sid, val)
+
+    def _subinner(self, state, sid, val):
+        obs = self._obsgen(val)
+        if not isinstance(obs, Observable):
+            obs = Observable.of(obs)
+
+        isid = []  # known after subscribing, completion comes later
+        # not _next, it would be merge_map's on_next in subclasses
+        disp = obs.subscribe(lambda v: Observable.on_next(self, v, sid),
+                             lambda: self._inner_completed(sid, isid[0]),
+                             lambda error: self.on_error(error, sid))
+        isid.append(disp.sid)
+        state.inner[disp.sid] = obs
+
+    def _inner_completed(self, sid, isid):
+        state = self._states.get(sid)
+        if state is None:
+            return  # gone meanwhile
+
+        state.inner.pop(isid, None)
+        if state.queue:
+            self._subinner(state, sid, state.queue.pop(0))
+        elif state.done and not state.inner:
+            self._states.pop(sid)
+            super().on_completed(sid)
+
+    def _stop(self, sid):
+        state = self._states.pop(sid, None)
+        if state is not None:
+            for isid, obs in state.inner.items():
+                obs._unsubscribe(isid)
+
+    def on_completed(self, sid):
+        state = self._states.get(sid)
+        if state is not None and (state.inner or state.queue):
+            state.done = True  # wait for the mapped observables
+            return
+
+        self._states.pop(sid, None)
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._stop(sid)
+        super().on_error(error, sid)
+
+    def _unsubscribed(self, sid):
+        self._stop(sid)
+
+
+class Concat_Map_Operator(Merge_Map_Operator):
+    '''
+    Like ``merge_map``, but mapped observables are subscribed one after
+    another: the next one is subscribed when the previous one completes.
+    '''
+
+    def __init__(self, handler):
+        super().__init__(handler, concurrency=1)
+
+
 class Nop_Operator(ObservableOperator):
     '''
     A no-operation operator. It will simply forward values.
     '''
-    pass  # forwards all operations
+    _fusable = True
+
+    def _stages(self):
+        return []  # forwards all operations
+
+
+class Observe_On_Operator(ObservableOperator):
+    '''
+    Deliver the values with ``scheduler`` from this point onwards in the chain.
+    Operators added after this one will use the same scheduler.
+
+    ``scheduler`` can be a ``Scheduler`` instance or one of the names:
+
+      - ``'immediate'`` (alias: ``'trampoline'``): synchronous delivery.
+        Deliveries which happen during another delivery are queued and
+        executed after it
+
+      - ``'microtask'``: delivery in the next microtask
+
+      - ``'animation_frame'``: delivery before the next repaint
+
+      - ``'timeout'``: delivery with a timeout for each value
+    '''
+
+    def __init__(self, scheduler):
+        self._scheduler = get_scheduler(scheduler)
+
+
+class On_Frame_Operator(ObservableOperator):
+    '''
+    Hold the latest value and forward it with the next animation frame, i.e.:
+    at most one value per frame is forwarded and the previous ones are
+    discarded.
+
+    Values are forwarded during the frame (and the operators chained after it
+    deliver also during the frame, with the ``immediate`` scheduler). Useful
+    to update the DOM no more often than the browser can paint it
+    '''
+    _timed_op = True
+
+    def __init__(self):
+        self._latest = {}  # sid -> latest value, waiting for the frame
+        self._scheduler = 'immediate'  # inherited by the operators after it
+
+    def _get_scheduler(self):
+        # its own deliveries wait for the frame
+        return get_scheduler('animation_frame')
+
+    def on_next(self, val, sid):
+        waiting = sid in self._latest
+        self._latest[sid] = val
+        if not waiting:
+            if not self._delay_next(sid, lambda: self._frame(sid)):
+                self._latest.pop(sid, None)  # stream is ending
+
+    def _frame(self, sid):
+        self._next(self._latest.pop(sid), sid)
+
+    def _unsubscribed(self, sid):
+        self._latest.pop(sid, None)
 
 
 class Publish_Operator(ObservableOperator):
@@ -317,6 +856,480 @@ class Publish_Operator(ObservableOperator):
         super().on_completed(sid)
 
 
+class Reduce_Operator(ObservableOperator):
+    '''
+    Accumulate the values with ``fn(acc, val)`` and forward the accumulated
+    value when the observable completes.
+
+    The accumulation starts with ``seed`` or, if not given, with the first
+    value. Nothing is forwarded if no ``seed`` was given and no value was
+    produced
+    '''
+
+    def __init__(self, fn, seed=_NOVAL):
+        self._fn = fn
+        self._seed = seed
+        self._accs = {}  # sid -> accumulated value
+
+    def on_next(self, val, sid):
+        acc = self._accs.get(sid, self._seed)
+        self._accs[sid] = val if acc is _NOVAL else self._fn(acc, val)
+
+    def on_completed(self, sid):
+        acc = self._accs.pop(sid, self._seed)
+        if acc is not _NOVAL:
+            self._next(acc, sid)
+
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._accs.pop(sid, None)
+        super().on_error(error, sid)
+
+    def _unsubscribed(self, sid):
+        self._accs.pop(sid, None)
+
+
+class Retry_Operator(ObservableOperator):
+    '''
+    Resubscribe to the observable if an error is produced, at most ``count``
+    times (unlimited if ``None``). The error is forwarded if no retries are
+    left
+    '''
+
+    def __init__(self, count=None):
+        self._count = count
+        self._retries = defaultdict(int)  # sid -> retries done
+
+    def on_error(self, error, sid):
+        n = self._retries[sid]
+        if sid not in self._sids or \
+           (self._count is not None and n >= self._count):
+            self._retries.pop(sid, None)
+            super().on_error(error, sid)
+            return
+
+        self._retries[sid] = n + 1
+        self._retry(sid, n)
+
+    def _retry(self, sid, n):
+        self._resubscribe(sid)
+
+    def _resubscribe(self, sid):
+        obs = self._parent
+        while obs is not None:  # the error was flagged along the chain
+            obs._error = None
+            obs = obs._parent
+
+        # Internal subscription, for the same sid
+        self._parent._subscribe(self, sid)
+
+    def _unsubscribed(self, sid):
+        self._retries.pop(sid, None)
+
+
+class Retry_When_Operator(Retry_Operator):
+    '''
+    Like ``retry``, but the resubscription is delayed by the amount of
+    milliseconds returned by ``backoff(n)``, where ``n`` is the retry number
+    (starting at ``0``).
+
+    ``backoff`` defaults to ``exponential()``. See ``exponential`` to create
+    a backoff with exponential delays (and jitter)
+    '''
+
+    def __init__(self, backoff=None, count=None):
+        super().__init__(count)
+        self._backoff = backoff if backoff is not None else exponential()
+        self._timers = {}  # sid -> timer of the pending retry
+
+    def _retry(self, sid, n):
+        def cb():
+            self._timers.pop(sid, None)
+            self._resubscribe(sid)
+
+        t = self._delay_next(sid, cb, self._backoff(n))
+        if t:
+            self._timers[sid] = t
+
+    def _unsubscribe(self, sid):
+        t = self._timers.pop(sid, None)
+        if t:  # don't wait for the retry to unsubscribe
+            self._delay_stop(sid, t)
+
+        super()._unsubscribe(sid)
+
+
+class _RollingState:
+    '''
+    State of a stream in a rolling aggregation
+
+      - win: ringbuffer with the (seq, tstamp, val) of the values in the
+        window
+      - seq: sequence number of the last value
+      - total: running sum of the values in the window
+    '''
+    __slots__ = ('win', 'seq', 'total')
+
+    def __init__(self):
+        self.win = ringbuffer()
+        self.seq = 0
+        self.total = 0
+
+    def copy(self):
+        st = _RollingState()
+        for item in self.win:
+            st.win.append(item)
+
+        st.seq, st.total = self.seq, self.total
+        return st
+
+
+class _RollingOperator(ObservableOperator):
+    '''
+    Base class for the aggregations over a window with the last ``count``
+    values and/or the values produced in the last ``ms`` milliseconds. The
+    aggregated value is forwarded with each value.
+
+    Subclasses implement ``_add`` / ``_removed`` to keep the aggregation up
+    to date with *O(1)* (amortized) work per value, and ``_result``. By
+    default the aggregation is the sum of the window
+    '''
+
+    def __init__(self, count=None, ms=None):
+        if count is None and ms is None:
+            raise ValueError('A window with count and/or ms is needed')
+
+        self._count = count
+        self._ms = ms
+        self._states = {}  # sid -> _RollingState
+
+    def _operate(self, val, sid):
+        # the result with val, leaving the window untouched (fetch)
+        return self._push(self._states.get(sid, _RollingState()).copy(), val)
+
+    def on_next(self, val, sid):
+        st = self._states.get(sid)
+        if st is None:
+            self._states[sid] = st = _RollingState()
+
+        Observable.on_next(self, self._push(st, val), sid)
+
+    def _push(self, st, val):
+        st.seq = seq = st.seq + 1
+        tstamp = now() if self._ms is not None else None
+        self._add(st, (seq, tstamp, val))
+
+        # remove from the oldest side what is out of the window
+        win, count, ms = st.win, self._count, self._ms
+        while win:
+            wseq, wtstamp, wval = win[0]
+            if not ((count is not None and wseq <= seq - count) or
+                    (ms is not None and wtstamp <= tstamp - ms)):
+                break
+
+            win.popleft()
+            self._removed(st, wval)
+
+        return self._result(st)
+
+    def _add(self, st, item):
+        st.win.append(item)
+        st.total += item[2]
+
+    def _removed(self, st, val):
+        st.total -= val
+
+    def _result(self, st):
+        return st.total
+
+    def on_completed(self, sid):
+        self._states.pop(sid, None)
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._states.pop(sid, None)
+        super().on_error(error, sid)
+
+    def _unsubscribed(self, sid):
+        self._states.pop(sid, None)
+
+
+class Rolling_Count_Operator(_RollingOperator):
+    '''
+    Forward with each value how many values are in the window with the last
+    ``count`` values and/or the values of the last ``ms`` milliseconds
+    '''
+
+    def _add(self, st, item):
+        st.win.append(item)
+
+    def _removed(self, st, val):
+        pass
+
+    def _result(self, st):
+        return len(st.win)
+
+
+class Rolling_Max_Operator(_RollingOperator):
+    '''
+    Forward with each value the maximum of the window with the last ``count``
+    values and/or the values of the last ``ms`` milliseconds
+    '''
+
+    def _add(self, st, item):
+        # keep only the values which can still be the maximum: decreasing
+        win, val = st.win, item[2]
+        while win and win[-1][2] <= val:
+            win.pop()
+
+        win.append(item)
+
+    def _removed(self, st, val):
+        pass
+
+    def _result(self, st):
+        return st.win[0][2]
+
+
+class Rolling_Mean_Operator(_RollingOperator):
+    '''
+    Forward with each value the mean of the window with the last ``count``
+    values and/or the values of the last ``ms`` milliseconds
+    '''
+
+    def _result(self, st):
+        return st.total / len(st.win)
+
+
+class Rolling_Sum_Operator(_RollingOperator):
+    '''
+    Forward with each value the sum of the window with the last ``count``
+    values and/or the values of the last ``ms`` milliseconds
+    '''
+    pass  # default behavior
+
+
+class Sample_Operator(ObservableOperator):
+    '''
+    Forward the most recent value, if a new one has arrived since the last
+    forwarding, each time that:
+
+      - ``sampler`` milliseconds have elapsed, if ``sampler`` is a number
+
+      - ``sampler`` generates a value, if ``sampler`` is an *Observable*
+    '''
+    _timed_op = True
+
+    def __init__(self, sampler):
+        self._sampler = sampler
+        self._last = {}  # sid -> most recent value not yet forwarded
+        self._tickers = {}  # sid -> timer or sid of the sampler subscription
+
+    def _substrigger(self, sid, **kwargs):
+        sampler = self._sampler
+        if isinstance(sampler, Observable):
+            disp = sampler.subscribe(lambda x: self._sample(sid))
+            self._tickers[sid] = disp.sid
+        else:
+            self._tick(sid)
+
+        return super()._substrigger(sid, **kwargs)
+
+    def _tick(self, sid):
+        t = self._delay_next(sid, lambda: self._ticked(sid), self._sampler)
+        if t:
+            self._tickers[sid] = t
+
+    def _ticked(self, sid):
+        self._tick(sid)
+        self._sample(sid)
+
+    def _sample(self, sid):
+        if sid in self._last:
+            self._next(self._last.pop(sid), sid)
+
+    def _stop(self, sid):
+        self._last.pop(sid, None)
+        t = self._tickers.pop(sid, None)
+        if t is not None:
+            if isinstance(self._sampler, Observable):
+                self._sampler._unsubscribe(t)
+            else:
+                self._delay_stop(sid, t)
+
+    def on_next(self, val, sid):
+        self._last[sid] = val
+
+    def on_completed(self, sid):
+        self._stop(sid)
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._stop(sid)
+        super().on_error(error, sid)
+
+    def _unsubscribe(self, sid):
+        if sid is not None:
+            self._stop(sid)
+
+        super()._unsubscribe(sid)
+
+
+class Scan_Operator(ObservableOperator):
+    '''
+    Accumulate the values with ``fn(acc, val)`` and forward each accumulated
+    value.
+
+    The accumulation starts with ``seed`` or, if not given, with the first
+    value (which is forwarded as is)
+    '''
+
+    def __init__(self, fn, seed=_NOVAL):
+        self._fn = fn
+        self._seed = seed
+        self._accs = {}  # sid -> accumulated value
+
+    def _operate(self, val, sid):
+        acc = self._accs.get(sid, self._seed)
+        return val if acc is _NOVAL else self._fn(acc, val)
+
+    def on_next(self, val, sid):
+        self._accs[sid] = acc = self._operate(val, sid)
+        Observable.on_next(self, acc, sid)
+
+    def on_completed(self, sid):
+        self._accs.pop(sid, None)
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._accs.pop(sid, None)
+        super().on_error(error, sid)
+
+    def _unsubscribed(self, sid):
+        self._accs.pop(sid, None)
+
+
+class Share_Operator(ObservableOperator):
+    '''
+    Share a single subscription to the observable among all subscribers.
+
+    The observable is subscribed to when the first subscriber arrives and the
+    generated values are delivered to all subscribers. When the last
+    subscriber unsubscribes, the subscription to the observable is also
+    cancelled. Subscribers arriving later will start a new subscription.
+
+    Unlike ``publish``, no explicit ``connect`` is needed.
+    '''
+
+    def __init__(self):
+        self._upsid = None  # sid of the shared subscription
+
+    def _substrigger(self, sid, **kwargs):
+        if self._upsid is not None:  # already connected
+            return Disposable(sid=sid)
+
+        self._error = None  # it may be a reconnection after an error
+        self._upsid = upsid = self._get_sid()
+        disp = self._parent._subscribe(self, upsid, **kwargs)
+        try:
+            val = disp.val
+        except AttributeError:  # no value fetched
+            return Disposable(sid=sid)
+
+        # processed by upstream, now downstream for this subscriber
+        return Disposable(sid=sid, val=self._suboperate(val, sid))
+
+    def _unsubscribe_parent(self, sid):
+        if not self._sids and self._upsid is not None:  # last one gone
+            upsid, self._upsid = self._upsid, None
+            self._parent._unsubscribe(upsid)
+
+    def _disconnect(self, sid):
+        if sid == self._upsid:  # the shared subscription is over
+            self._upsid = None
+
+        return None  # deliver to all subscribers
+
+    def on_next(self, val, sid):
+        if sid == self._upsid:  # not from a dropped subscription
+            super().on_next(val, None)
+
+    def on_completed(self, sid):
+        if sid == self._upsid:
+            super().on_completed(self._disconnect(sid))
+
+    def on_error(self, error, sid):
+        if sid == self._upsid:
+            super().on_error(error, self._disconnect(sid))
+
+
+class Share_Replay_Operator(Share_Operator):
+    '''
+    Like ``share``, but the last ``buffer_size`` values (all if ``None``) are
+    kept and delivered to subscribers arriving later, without subscribing
+    again to the observable, even if it has already completed.
+
+    Subscribers which pre-fetch values (``fetch=True``, like html nodes do)
+    receive the last value directly with the subscription.
+
+    If ``ttl_ms`` is given, kept values expire ``ttl_ms`` milliseconds after
+    the last one was received (or the completion). The next subscriber
+    subscribes again to the observable, replacing the subscription in use, if
+    any (sources like ``HttpRequest`` never complete). All subscribers
+    receive the new values.
+    '''
+
+    def __init__(self, buffer_size=1, ttl_ms=None):
+        super().__init__()
+        self._buffer = deque(maxlen=buffer_size)
+        self._ttl = ttl_ms
+        self._stamp = 0  # time of the last value
+        self._completed = False  # values are all there is
+
+    def _substrigger(self, sid, **kwargs):
+        if self._ttl is not None and (self._buffer or self._completed) and \
+           now() - self._stamp >= self._ttl:
+            del self._buffer[:]  # expired
+            self._completed = False
+            if self._upsid is not None:  # stale, subscribe again below
+                upsid, self._upsid = self._upsid, None
+                self._parent._unsubscribe(upsid)
+
+        if self._upsid is None and not self._completed:
+            disp = super()._substrigger(sid, **kwargs)  # (re)connect
+        else:
+            disp = Disposable(sid=sid)
+
+        for val in self._buffer:  # replay only for the new subscriber
+            Observable.on_next(self, val, sid)
+
+        if self._completed:
+            Observable.on_completed(self, sid)
+
+        if self._buffer and kwargs.get('fetch', False):
+            disp.val = self._suboperate(self._buffer[-1], sid)
+
+        return disp
+
+    def on_next(self, val, sid):
+        if sid == self._upsid:
+            self._buffer.append(val)
+            self._stamp = now()
+            super().on_next(val, sid)
+
+    def on_completed(self, sid):
+        if sid == self._upsid:
+            self._completed = True
+            self._stamp = now()
+            super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        if sid == self._upsid:
+            del self._buffer[:]  # nothing to replay, subscribe again
+            super().on_error(error, sid)
+
+
 class Switch_Map_Operator(ObservableOperator):
     '''
     Swith to another observable based:
@@ -380,15 +1393,66 @@ class Take_Operator(ObservableOperator):
 
     def on_next(self, val, sid):
         totake = self.to_take[sid]
+        if totake < 0:  # already completed, late value
+            return
+
         if totake:
             self.to_take[sid] = totake - 1
             # self._delay_next(sid, lambda: self._next(val, sid))
             self._next(val, sid)
 
         if totake <= 1:
-            self.to_take[sid] = 0
+            self.to_take[sid] = -1
             self.on_completed(sid)
-            self._unsubscribe(sid)
+            # after completion, which may be delivered later
+            call_soon(lambda: self._unsubscribe(sid))
+
+    def _listening(self, sid):
+        return self.to_take.get(sid, 0) >= 0 and super()._listening(sid)
+
+
+class Throttle_Operator(ObservableOperator):
+    '''
+    Forward a value and then ignore values for ``ms`` milliseconds.
+
+      - ``leading`` (default: ``True``): forward the value which opens the
+        ignoring window
+
+      - ``trailing`` (default: ``False``): forward the last value received
+        during the window when it closes, which opens a new window
+    '''
+    _timed_op = True
+
+    def __init__(self, ms, leading=True, trailing=False):
+        self.tout = ms
+        self._leading = leading
+        self._trailing = trailing
+        self._windows = {}  # sid -> timer of the open window
+        self._pending = {}  # sid -> last value received in the window
+
+    def _open(self, sid):
+        t = self._delay_next(sid, lambda: self._close(sid), self.tout)
+        if t:
+            self._windows[sid] = t
+
+    def _close(self, sid):
+        self._windows.pop(sid, None)
+        if sid in self._pending:
+            val = self._pending.pop(sid)
+            self._open(sid)
+            self._next(val, sid)
+
+    def on_next(self, val, sid):
+        if sid in self._windows:
+            if self._trailing:
+                self._pending[sid] = val
+            return
+
+        self._open(sid)
+        if self._leading:
+            self._next(val, sid)
+        elif self._trailing:
+            self._pending[sid] = val
 
 
 class Throw__Operator(ObservableOperator):
@@ -403,3 +1467,135 @@ class Throw__Operator(ObservableOperator):
 
     def on_next(self, val, sid):
         self.on_error(self._throw, sid)
+
+
+class Timeout_Operator(ObservableOperator):
+    '''
+    Give up if the observable does not produce a value within ``ms``
+    milliseconds of the subscription. The observable is unsubscribed (an
+    in-flight ``HttpRequest`` is aborted) and:
+
+      - If ``fallback`` is ``None``, a ``TimeoutError`` is produced as error
+
+      - If ``fallback`` is an *Observable*, it will be switched to
+
+      - Else, ``fallback`` must be a callable (without arguments) returning
+        the value to switch to. If it is not an *Observable* it will be
+        converted using ``Observable.of``
+    '''
+
+    def __init__(self, ms, fallback=None):
+        self.tout = ms
+        self._fallback = fallback
+        self._timers = {}  # sid -> timer
+        self._switched = {}  # sid -> fallback observable switched to
+
+    def _arm(self, sid):
+        self._timers[sid] = self._get_scheduler().schedule(
+            lambda: self._expired(sid), self.tout)
+
+    def _disarm(self, sid):
+        t = self._timers.pop(sid, None)
+        if t:
+            self._get_scheduler().cancel(t)
+
+    def _expired(self, sid):
+        self._timers.pop(sid, None)
+        if sid not in self._sids:
+            return  # stream already ended
+
+        self._parent._unsubscribe(sid)  # give up on the source
+        fallback = self._fallback
+        if fallback is None:
+            error = TimeoutError('No value in {} ms'.format(self.tout))
+            self.on_error(error, sid)
+            return
+
+        if not isinstance(fallback, Observable):
+            fallback = fallback()
+            if not isinstance(fallback, Observable):
+                fallback = Observable.of(fallback)
+
+        # Internal subscription, for the same sid
+        self._switched[sid] = fallback
+        fallback._subscribe(self, sid)
+
+    def _substrigger(self, sid, **kwargs):
+        self._arm(sid)
+        return super()._substrigger(sid, **kwargs)
+
+    def on_next(self, val, sid):
+        self._disarm(sid)  # in time
+        super().on_next(val, sid)
+
+    def on_completed(self, sid):
+        self._disarm(sid)
+        self._switched.pop(sid, None)
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._disarm(sid)
+        self._switched.pop(sid, None)
+        super().on_error(error, sid)
+
+    def _unsubscribe_parent(self, sid):
+        fallback = self._switched.pop(sid, None)
+        if fallback is not None:
+            fallback._unsubscribe(sid)
+        else:
+            super()._unsubscribe_parent(sid)
+
+    def _unsubscribed(self, sid):
+        self._disarm(sid)
+
+
+class With_Latest_From_Operator(ObservableOperator):
+    '''
+    Combine each value with the latest values produced by ``others`` (a list
+    of observables), forwarding ``fn(val, *latest)`` or a tuple with the value
+    and the latest values if ``fn`` is ``None``.
+
+    Values are discarded until all ``others`` have produced a value
+    '''
+
+    def __init__(self, *others, fn=None):
+        self._others = others
+        self._fn = fn
+        self._recs = {}  # sid -> _Inputs
+
+    def _substrigger(self, sid, **kwargs):
+        self._recs[sid] = rec = _Inputs(self._others)
+        fetched = rec.subscribe(rec.set, rec.completed,
+                                lambda error: self.on_error(error, sid),
+                                fetch=kwargs.get('fetch', False))
+        for i, val in enumerate(fetched):
+            if val is not _NOVAL:
+                rec.set(i, val)
+
+        return super()._substrigger(sid, **kwargs)
+
+    def _operate(self, val, sid):
+        rec = self._recs.get(sid)
+        if rec is None or rec.missing:
+            raise ObservableStopError()  # not all others are there
+
+        if self._fn is None:
+            return (val,) + tuple(rec.vals)
+
+        return self._fn(val, *rec.vals)
+
+    def _stop(self, sid):
+        rec = self._recs.pop(sid, None)
+        if rec is not None:
+            rec.unsubscribe()
+
+    def on_completed(self, sid):
+        self._stop(sid)
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._stop(sid)
+        super().on_error(error, sid)
+
+    def _unsubscribed(self, sid):
+        self._stop(sid)
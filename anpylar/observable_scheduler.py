@@ -0,0 +1,158 @@
+###############################################################################
+# Copyright 2018 The AnPyLar Team. All Rights Reserved.
+# Use of this source code is governed by an MIT-style license that
+# can be found in the LICENSE file at http://anpylar.com/mit-license
+###############################################################################
+import browser.timer as btimer
+
+from .timer import call_soon, call_delayed, call_cancel
+
+
+__all__ = ['Scheduler', 'ImmediateScheduler', 'MicrotaskScheduler',
+           'AnimationFrameScheduler', 'TimeoutScheduler']
+
+
+class _Task:
+    '''
+    Holds a callable scheduled for later execution. Acts as handle to cancel
+    the execution
+    '''
+    __slots__ = ('fn', 'cancelled')
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.cancelled = False
+
+
+class Scheduler:
+    '''
+    Base class for the schedulers which decide how values are delivered by
+    *Observables* to their subscribers.
+
+    Delayed executions (``tout > 0``) are always delegated to the timer
+    '''
+
+    def schedule(self, fn, tout=0):
+        '''Schedule ``fn`` for execution. Returns a handle for ``cancel``'''
+        return call_delayed(tout, fn)
+
+    def cancel(self, handle):
+        '''Cancel the execution of a handle returned by ``schedule``'''
+        if isinstance(handle, _Task):
+            handle.cancelled = True
+        elif handle:
+            call_cancel(handle)
+
+
+class TimeoutScheduler(Scheduler):
+    '''
+    Each execution is scheduled with its own timeout (*setTimeout*)
+    '''
+    pass  # default behavior
+
+
+class MicrotaskScheduler(Scheduler):
+    '''
+    Executions are queued with ``call_soon`` and run together in the next
+    *microtask*, i.e.: after the current script, but before the browser gets
+    control back
+    '''
+
+    def schedule(self, fn, tout=0):
+        if tout:
+            return super().schedule(fn, tout)
+
+        return call_soon(fn)
+
+
+class AnimationFrameScheduler(Scheduler):
+    '''
+    Executions are queued and run together right before the next repaint of
+    the browser (*requestAnimationFrame*), with a single request per frame
+    '''
+
+    frame_time = None  # timestamp of the frame being run
+
+    def __init__(self):
+        self._queue = []
+        self._pending = False
+
+    def schedule(self, fn, tout=0):
+        if tout:
+            return super().schedule(fn, tout)
+
+        self._queue.append(_Task(fn))
+        if not self._pending:
+            self._pending = True
+            btimer.request_animation_frame(self._drain)
+
+        return self._queue[-1]
+
+    def _drain(self, tstamp=None, *args):
+        self.frame_time = tstamp
+        # tasks scheduled during the drain go to a new queue and frame
+        queue, self._queue = self._queue, []
+        self._pending = False
+        for task in queue:
+            if not task.cancelled:
+                task.fn()
+
+
+class ImmediateScheduler(Scheduler):
+    '''
+    Executions run synchronously. Executions scheduled during another
+    execution (re-entrancy) are queued and run after the current one has
+    finished (*trampoline*), to avoid deep recursion and keep delivery order
+    '''
+
+    def __init__(self):
+        self._queue = []
+        self._running = False
+
+    def schedule(self, fn, tout=0):
+        if tout:
+            return super().schedule(fn, tout)
+
+        if self._running:
+            task = _Task(fn)
+            self._queue.append(task)
+            return task
+
+        self._running = True
+        queue = self._queue
+        i = 0
+        try:
+            fn()
+            while i < len(queue):  # queue can grow during the loop
+                task = queue[i]
+                i += 1
+                if not task.cancelled:
+                    task.fn()
+        finally:
+            del queue[:i]
+            self._running = False
+
+        return None  # already executed, nothing can be cancelled
+
+
+_schedulers = {
+    'immediate': ImmediateScheduler(),
+    'microtask': MicrotaskScheduler(),
+    'animation_frame': AnimationFrameScheduler(),
+    'timeout': TimeoutScheduler(),
+}
+_schedulers['trampoline'] = _schedulers['immediate']
+
+
+def get_scheduler(scheduler):
+    '''
+    Returns ``scheduler`` if it is a ``Scheduler`` instance or else the
+    scheduler registered under the name ``scheduler``
+    '''
+    if isinstance(scheduler, Scheduler):
+        return scheduler
+
+    try:
+        return _schedulers[scheduler]
+    except KeyError:
+        raise ValueError('Unknown scheduler: {}'.format(scheduler))
@@ -3,27 +3,457 @@
 # Use of this source code is governed by an MIT-style license that
 # can be found in the LICENSE file at http://anpylar.com/mit-license
 ###############################################################################
-from .observable_base import ObservableSource, _MetaObservableSource
+from . import config as aconfig
+from .observable_base import (ObservableSource, _MetaObservableSource,
+                              ObservableFetchError, _propagation)
+from .timer import call_delayed, call_cancel, now
 
-from .utils import defaultdict
+from .utils import defaultdict, ringbuffer
 
 
 __all__ = []
 
 
-class From__Source(ObservableSource):
+class _PullSource(ObservableSource):
+    '''
+    Base class for sources which pull the values from an iterator in chunks of
+    ``chunk_size`` (default: ``config.observable.chunk_size``).
+
+    The next chunk is pulled after a timeout (to let the browser breathe) once
+    the previous one has been delivered. Pulling stops if nobody downstream
+    wants more values (unsubscribed or completed downstream, like with
+    ``take``), even if the unsubscription has not arrived yet
+
+    If ``_budget`` (milliseconds) is set, a chunk ends when the time is spent
+    instead of after ``chunk_size`` values.
+
+    Exceptions raised by the iterator are delivered as errors
+    '''
+    _chunk_size = None
+    _budget = None
+
+    def _iterator(self):
+        return ()  # nothing to pull, complete
+
+    def _subscribed(self, sid, **kwargs):
+        self._pull(iter(self._iterator()), sid)
+
+    def _pull(self, it, sid):
+        st = self._sids.get(sid)
+        if st is None or not self._listening(sid):
+            return  # nobody is listening, stop pulling
+
+        if st.in_next:  # previous chunk not delivered yet, wait for it
+            call_delayed(0, lambda: self._pull(it, sid))
+            return
+
+        budget = self._budget
+        if budget is not None:
+            chunk, tend = 0, now() + budget
+        else:
+            chunk = self._chunk_size or aconfig.observable.chunk_size
+
+        count = 0
+        try:
+            for x in it:
+                self.on_next(x, sid=sid)
+                count += 1
+                if count == chunk or (budget is not None and now() >= tend):
+                    call_delayed(0, lambda: self._pull(it, sid))
+                    return
+        except Exception as e:
+            self.on_error(e, sid)
+            return
+
+        self.on_completed(sid=sid)
+
+
+_NOVAL = object()  # marker for inputs which have not produced a value
+
+
+class _Inputs:
+    '''
+    Holds, for a stream, the subscriptions to several input observables and
+    the latest value produced by each of them
+    '''
+    __slots__ = ('obs', 'isids', 'vals', 'missing', 'active')
+
+    def __init__(self, observables):
+        n = len(observables)
+        self.obs = observables
+        self.isids = [None] * n  # sids of the subscriptions to the inputs
+        self.vals = [_NOVAL] * n
+        self.missing = n  # inputs which have not produced a value
+        self.active = n  # inputs which have not completed
+
+    def subscribe(self, on_next, on_completed, on_error, **kwargs):
+        # on_next and on_completed receive the index of the input. Returns
+        # the fetched values (or _NOVAL)
+        fetched = []
+        for i, obs in enumerate(self.obs):
+            disp = obs.subscribe(lambda v, i=i: on_next(i, v),
+                                 lambda i=i: on_completed(i),
+                                 on_error, **kwargs)
+            self.isids[i] = disp.sid
+            fetched.append(getattr(disp, 'val', _NOVAL))
+
+        return fetched
+
+    def set(self, i, val):
+        if self.vals[i] is _NOVAL:
+            self.missing -= 1
+
+        self.vals[i] = val
+
+    def completed(self, i):
+        if self.isids[i] is not None:
+            self.isids[i] = None
+            self.active -= 1
+
+    def unsubscribe(self):
+        for i, isid in enumerate(self.isids):
+            if isid is not None:
+                self.isids[i] = None
+                self.obs[i]._unsubscribe(isid)
+
+
+class _InputsSource(ObservableSource):
+    '''
+    Base class for sources which subscribe to several ``observables`` for each
+    stream. The stream completes when all inputs have completed
+    '''
+    _inputs = _Inputs  # record class for the inputs of a stream
+
+    def __init__(self, *observables):
+        self._obs = observables
+        self._recs = {}  # sid -> _Inputs
+
+    def _subscribed(self, sid, **kwargs):
+        self._recs[sid] = rec = self._inputs(self._obs)
+        fetch = kwargs.get('fetch', False)
+        fetched = rec.subscribe(
+            lambda i, val: self._input_next(sid, i, val),
+            lambda i: self._input_completed(sid, i),
+            lambda error: self._input_error(sid, error),
+            fetch=fetch,
+        )
+        if fetch:
+            self._fetched(rec, fetched)
+
+    def _fetched(self, rec, fetched):
+        pass
+
+    def _deps(self):
+        return list(self._obs)
+
+    def _input_next(self, sid, i, val):
+        rec = self._recs.get(sid)
+        if rec is not None:
+            self._on_input(rec, sid, i, val)
+
+    def _on_input(self, rec, sid, i, val):
+        pass
+
+    def _input_completed(self, sid, i):
+        rec = self._recs.get(sid)
+        if rec is not None:
+            rec.completed(i)
+            if self._input_done(rec, i):
+                self._finish(sid)
+
+    def _input_done(self, rec, i):
+        return not rec.active
+
+    def _input_error(self, sid, error):
+        rec = self._recs.pop(sid, None)
+        if rec is not None:
+            rec.unsubscribe()
+            self.on_error(error, sid)
+
+    def _finish(self, sid):
+        rec = self._recs.pop(sid, None)
+        if rec is not None:
+            rec.unsubscribe()
+            self.on_completed(sid)
+
+    def _unsubscribed(self, sid):
+        rec = self._recs.pop(sid, None)
+        if rec is not None:
+            rec.unsubscribe()
+
+
+class Combine_Latest_Source(_InputsSource):
+    '''
+    Combines the latest values of ``observables``. Each time any of them
+    produces a value, ``fn(*latest)`` (or a tuple of the latest values if
+    ``fn`` is ``None``) is generated, once all have produced a value.
+
+    Subscribers which pre-fetch (``fetch=True``) receive the combination of
+    the pre-fetched values of ``observables``, if all are available.
+
+    Also available as operator: ``obs.combine_latest(*others, fn=None)``
+    '''
+    _as_operator = True
+
+    def __init__(self, *observables, fn=None):
+        super().__init__(*observables)
+        self._fn = fn
+
+    def _combine(self, vals):
+        if self._fn is None:
+            return tuple(vals)
+
+        return self._fn(*vals)
+
+    def _fetched(self, rec, fetched):
+        for i, val in enumerate(fetched):
+            if val is not _NOVAL:
+                rec.set(i, val)
+
+        if not rec.missing:
+            raise ObservableFetchError(self._combine(rec.vals))
+
+    def _on_input(self, rec, sid, i, val):
+        rec.set(i, val)
+        if rec.missing:
+            return
+
+        if aconfig.observable.glitch_free:
+            _propagation.mark(self, sid)  # recompute once for all inputs
+        else:
+            self.on_next(self._combine(rec.vals), sid)
+
+    def _propagate(self, sid):
+        rec = self._recs.get(sid)
+        if rec is not None:
+            try:
+                val = self._combine(rec.vals)
+            except Exception as e:
+                self.on_error(e, sid)
+            else:
+                self.on_next(val, sid)
+
+    def _finish(self, sid):
+        _propagation.settle(self, sid)  # deliver a pending recomputation
+        super()._finish(sid)
+
+    def _input_done(self, rec, i):
+        # if an input completes without a value, nothing can be combined
+        return not rec.active or rec.vals[i] is _NOVAL
+
+
+class Merge_Source(_InputsSource):
+    '''
+    Generates the values produced by all ``observables`` as they arrive
+
+    Also available as operator: ``obs.merge(*others)``
+    '''
+    _as_operator = True
+
+    def _on_input(self, rec, sid, i, val):
+        self.on_next(val, sid)
+
+
+class _ZipInputs(_Inputs):
+    __slots__ = ('queues', 'ready')
+
+    def __init__(self, observables, max_queue=None):
+        super().__init__(observables)
+        # a full queue discards the oldest value when appending
+        self.queues = [ringbuffer(maxlen=max_queue) for x in observables]
+        self.ready = 0  # queues with values
+
+
+class Zip_Source(_InputsSource):
+    '''
+    Combines the values of ``observables`` in order: the n-th value generated
+    is ``fn(*nth_values)`` (or a tuple of them if ``fn`` is ``None``).
+
+    Values waiting for their partners are queued. The oldest values in a
+    queue are discarded to keep the size at most at ``max_queue`` (default:
+    ``config.observable.zip_max_queue``, no limit if ``0``)
+
+    Also available as operator: ``obs.zip(*others, fn=None, max_queue=None)``
+    '''
+    _as_operator = True
+
+    def __init__(self, *observables, fn=None, max_queue=None):
+        super().__init__(*observables)
+        self._fn = fn
+        if max_queue is None:
+            max_queue = aconfig.observable.zip_max_queue
+
+        self._max_queue = max_queue
+
+    def _inputs(self, observables):
+        return _ZipInputs(observables, self._max_queue)
+
+    def _on_input(self, rec, sid, i, val):
+        q = rec.queues[i]
+        if not q:
+            rec.ready += 1
+
+        q.append(val)
+        if rec.ready < len(rec.queues):
+            return  # some value is missing
+
+        vals = []
+        for q in rec.queues:
+            vals.append(q.popleft())
+            if not q:
+                rec.ready -= 1
+
+        if self._fn is None:
+            self.on_next(tuple(vals), sid)
+        else:
+            self.on_next(self._fn(*vals), sid)
+        if rec.ready < len(rec.queues):  # finish if missing ones won't come
+            if any(isid is None and not q
+                   for isid, q in zip(rec.isids, rec.queues)):
+                self._finish(sid)
+
+    def _input_done(self, rec, i):
+        # a completed input with no queued values can no longer deliver
+        return not rec.active or not rec.queues[i]
+
+
+class _Clock:
+    '''
+    A clock ticking every ``period`` milliseconds, shared by all interval
+    subscriptions with the same period. It runs only while it has listeners.
+
+    Ticks missed because the timer fired late (like in a background tab) are
+    dropped: the clock ticks once and goes on with the next period
+
+    A listener gets no tick sooner than ``period`` after being added: the
+    first one comes between one and two periods later
+    '''
+    _clocks = {}  # period -> _Clock
+
+    @classmethod
+    def get(cls, period):
+        clock = cls._clocks.get(period)
+        if clock is None:
+            cls._clocks[period] = clock = cls(period)
+
+        return clock
+
+    def __init__(self, period):
+        self.period = period
+        self.listeners = {}  # key -> (callable, time of the first tick)
+        self.deadline = None
+        self.timer = None
+
+    def add(self, key, cb):
+        self.listeners[key] = (cb, now() + self.period)
+        if self.timer is None:
+            self.deadline = now() + self.period
+            self.timer = call_delayed(self.period, self._tick)
+
+    def remove(self, key):
+        self.listeners.pop(key, None)
+        if not self.listeners:
+            if self.timer is not None:
+                call_cancel(self.timer)
+                self.timer = None
+
+            self._clocks.pop(self.period, None)
+
+    def _tick(self):
+        tnow, period = now(), self.period
+        tick = self.deadline  # when it should have ticked, not when it did
+        deadline = tick + period
+        if deadline <= tnow:  # late, drop the missed ticks
+            deadline = tnow + period - (tnow - deadline) % period
+
+        self.deadline = deadline
+        self.timer = call_delayed(deadline - tnow, self._tick)
+        for cb, first in list(self.listeners.values()):  # cbs may remove
+            if tick >= first:  # else: added less than a period ago
+                cb()
+
+
+class From__Source(_PullSource):
     '''
     Generates an observable from ``iterable``, generating as many values as
     elements are present in ``iterable``
+
+    The values are pulled in chunks of ``chunk_size``
     '''
-    def __init__(self, iterable):
+    def __init__(self, iterable, chunk_size=None):
         self._iterable = iterable
+        self._chunk_size = chunk_size
+
+    def _iterator(self):
+        return self._iterable
+
+
+class From_Generator_Source(_PullSource):
+    '''
+    Generates the values produced by ``gen``, a generator (or any iterator)
+    or a callable returning one (to have a new one for each subscription).
+
+    The generator is advanced until ``budget_ms`` milliseconds are spent.
+    Then the browser gets control back (to render and handle input) before
+    advancing it again, once the values have been delivered.
+
+    Unsubscribing stops advancing it and closes it
+    '''
+    def __init__(self, gen, budget_ms=8):
+        self._gen = gen
+        self._budget = budget_ms
+        self._its = {}  # sid -> iterator
 
     def _subscribed(self, sid, **kwargs):
-        for x in self._iterable:
-            self.on_next(x, sid=sid)
+        gen = self._gen() if callable(self._gen) else self._gen
+        self._its[sid] = it = iter(gen)
+        self._pull(it, sid)
 
-        self.on_completed(sid=sid)
+    def _close(self, sid):
+        close = getattr(self._its.pop(sid, None), 'close', None)
+        if close is not None:
+            close()  # let the generator run its finally/with blocks
+
+    def on_completed(self, sid):
+        self._its.pop(sid, None)
+        super().on_completed(sid)
+
+    def on_error(self, error, sid):
+        self._its.pop(sid, None)
+        super().on_error(error, sid)
+
+    def _unsubscribed(self, sid):
+        self._close(sid)
+
+
+class Interval_Source(ObservableSource):
+    '''
+    Generates an increasing count (starting at ``0``) every ``ms``
+    milliseconds.
+
+    All intervals with the same ``ms`` tick together from a shared clock.
+    The first value comes therefore with the first tick of the clock at least
+    ``ms`` after subscribing, i.e.: between ``ms`` and ``2 * ms``. Ticks
+    missed because the browser delayed the timer (background tabs) are not
+    generated later
+    '''
+    def __init__(self, ms):
+        self._ms = ms
+        self._counts = {}  # sid -> next count
+
+    def _subscribed(self, sid, **kwargs):
+        self._counts[sid] = 0
+        _Clock.get(self._ms).add((id(self), sid), lambda: self._tick(sid))
+
+    def _tick(self, sid):
+        count = self._counts.get(sid)
+        if count is not None:
+            self._counts[sid] = count + 1
+            self.on_next(count, sid)
+
+    def _unsubscribed(self, sid):
+        if self._counts.pop(sid, None) is not None:
+            _Clock.get(self._ms).remove((id(self), sid))
 
 
 class Of_Source(ObservableSource):
@@ -41,21 +471,21 @@ class Of_Source(ObservableSource):
         self.on_completed(sid=sid)
 
 
-class Range_Source(ObservableSource):
+class Range_Source(_PullSource):
     '''
     Generates an observable that will issue ``count`` events starting with
     ``start`` and increasing each iteration by ``step``
+
+    The values are generated in chunks of ``chunk_size``
     '''
-    def __init__(self, start, count, step=1):
+    def __init__(self, start, count, step=1, chunk_size=None):
         self._start = start
         self._count = count
         self._step = step
+        self._chunk_size = chunk_size
 
-    def _subscribed(self, sid, **kwargs):
-        for i in range(self._start, self._start + self._count, self._step):
-            self.on_next(i, sid=sid)
-
-        self.on_completed(sid=sid)
+    def _iterator(self):
+        return range(self._start, self._start + self._count, self._step)
 
 
 class Throw__Source(ObservableSource):
@@ -70,3 +500,38 @@ class Throw__Source(ObservableSource):
 
     def _subscribed(self, sid, **kwargs):
         self.on_error(self._throw, sid)
+
+
+class Timer_Source(Interval_Source):
+    '''
+    Generates ``0`` after ``due`` milliseconds and completes.
+
+    If ``period`` is given, it does not complete and goes on generating an
+    increasing count every ``period`` milliseconds, like ``interval``
+    (sharing the clock with intervals of the same period)
+    '''
+    def __init__(self, due, period=None):
+        super().__init__(period)
+        self._due = due
+        self._timers = {}  # sid -> timer for due
+
+    def _subscribed(self, sid, **kwargs):
+        self._timers[sid] = call_delayed(self._due, lambda: self._fire(sid))
+
+    def _fire(self, sid):
+        if self._timers.pop(sid, None) is None:
+            return  # unsubscribed meanwhile
+
+        self.on_next(0, sid)
+        if self._ms is None:
+            self.on_completed(sid)
+        else:
+            super()._subscribed(sid)
+            self._counts[sid] = 1
+
+    def _unsubscribed(self, sid):
+        t = self._timers.pop(sid, None)
+        if t is not None:
+            call_cancel(t)
+
+        super()._unsubscribed(sid)
@@ -0,0 +1,110 @@
+###############################################################################
+# Copyright 2018 The AnPyLar Team. All Rights Reserved.
+# Use of this source code is governed by an MIT-style license that
+# can be found in the LICENSE file at http://anpylar.com/mit-license
+###############################################################################
+from .observable_base import (Observable, ObservableSource,
+                              ObservableFetchError)
+
+from .utils import deque
+
+
+__all__ = ['Subject', 'BehaviorSubject', 'ReplaySubject']
+
+
+class Subject(ObservableSource):
+    '''
+    A multicast *Observable* to which values can be pushed with
+    ``on_next(val)`` or by calling it (like bindings) with ``subject(val)``.
+    Each value is delivered to the subscribers present when it was pushed.
+
+    It can also subscribe to other observables, forwarding what they produce
+    to all its subscribers.
+
+    After ``on_completed`` or ``on_error``, late subscribers are notified
+    the completion or error.
+    '''
+    _stopped = False
+
+    def on_next(self, val, sid=None):
+        # sid is ignored: values from any source are multicasted
+        if not self._stopped:
+            super().on_next(val)
+
+    def on_completed(self, sid=None):
+        if not self._stopped:
+            self._stopped = True
+            super().on_completed(None)
+
+    def on_error(self, error, sid=None):
+        if not self._stopped:
+            self._stopped = True
+            super().on_error(error, None)
+
+    def _subscribed(self, sid, **kwargs):
+        if self._error is not None:
+            Observable.on_error(self, self._error, sid)
+        elif self._stopped:
+            Observable.on_completed(self, sid)
+
+    def __call__(self, val, who=None):
+        self.on_next(val)
+        return val
+
+
+class BehaviorSubject(Subject):
+    '''
+    A ``Subject`` which holds the last pushed value (starting with ``value``)
+    and delivers it to new subscribers.
+
+    Subscribers which want to pre-fetch the value (``fetch=True``, like html
+    nodes do) receive it directly with the subscription.
+    '''
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def get_val(self):
+        return self.value
+
+    def on_next(self, val, sid=None):
+        if not self._stopped:
+            self.value = val
+            super().on_next(val)
+
+    def _subscribed(self, sid, **kwargs):
+        if self._stopped:
+            return super()._subscribed(sid, **kwargs)
+
+        val = self.value
+        Observable.on_next(self, val, sid)  # only for the new subscriber
+
+        if kwargs.get('fetch', False):  # someone wants to pre-fetch
+            raise ObservableFetchError(val)
+
+
+class ReplaySubject(Subject):
+    '''
+    A ``Subject`` which keeps the last ``buffer_size`` values (all if
+    ``None``) and delivers them to new subscribers.
+
+    Subscribers which want to pre-fetch (``fetch=True``) receive the last
+    value directly with the subscription.
+    '''
+
+    def __init__(self, buffer_size=None):
+        self._buffer = deque(maxlen=buffer_size)
+
+    def on_next(self, val, sid=None):
+        if not self._stopped:
+            self._buffer.append(val)
+            super().on_next(val)
+
+    def _subscribed(self, sid, **kwargs):
+        for val in self._buffer:  # even if stopped, values were produced
+            Observable.on_next(self, val, sid)
+
+        super()._subscribed(sid, **kwargs)
+
+        if self._buffer and kwargs.get('fetch', False):
+            raise ObservableFetchError(self._buffer[-1])
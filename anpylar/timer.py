@@ -3,25 +3,189 @@
 # Use of this source code is governed by an MIT-style license that
 # can be found in the LICENSE file at http://anpylar.com/mit-license
 ###############################################################################
+from browser import window
 import browser.timer as timer
+import heapq
 
+from . import config as aconfig
 
-__all__ = ['call_soon', 'call_delayed', 'call_cancel']
+
+__all__ = ['call_soon', 'call_delayed', 'call_cancel', 'live_timers']
+
+
+class _Handle:
+    '''
+    Handle for a callback queued with ``call_soon`` or ``call_delayed``, which
+    can be cancelled with ``call_cancel``. ``slot`` is only set for delayed
+    callbacks
+    '''
+    __slots__ = ('cb', 'cancelled', 'slot')
+
+    def __init__(self, cb, slot=None):
+        self.cb = cb
+        self.cancelled = False
+        self.slot = slot
+
+
+# FIFO queue of callbacks from call_soon, drained in a single host callback
+_soon = []
+_soon_pending = False
+
+try:
+    _promise = window.Promise.resolve()
+except AttributeError:  # no promises, timeouts will be used
+    _promise = None
+
+
+def _soon_request(yield_=False):
+    global _soon_pending
+    _soon_pending = True
+    if _promise is None or yield_:
+        timer.set_timeout(_soon_drain, 0)
+    else:
+        _promise.then(_soon_drain)  # microtask
+
+
+def _soon_drain(*args):
+    global _soon_pending
+    soon_max = aconfig.timer.call_soon_max
+    i = 0
+    try:
+        # callbacks queued during the drain are also executed
+        while i < len(_soon) and i < soon_max:
+            handle = _soon[i]
+            i += 1
+            if not handle.cancelled:
+                handle.cb()
+    finally:
+        del _soon[:i]
+        _soon_pending = False
+        if _soon:  # cap reached or error: let the browser breathe
+            _soon_request(yield_=True)
 
 
 def call_soon(cb, *args, **kwargs):
-    if not args and not kwargs:
-        return timer.set_timeout(cb, 0)
+    if args or kwargs:
+        cb = (lambda f=cb: f(*args, **kwargs))
+
+    handle = _Handle(cb)
+    _soon.append(handle)
+    if not _soon_pending:
+        _soon_request()
+
+    return handle
+
+
+# Timer wheel for call_delayed. Callbacks are bucketed in slots of
+# config.timer.resolution milliseconds, keyed by the slot of their deadline.
+# A single host timer is armed for the earliest slot and fires all callbacks
+# in due slots
+_slots = {}  # slot -> list of handles
+_slots_heap = []  # pending slots, to find the earliest
+_host = None  # (timer id, slot) of the armed host timer
+_live = 0  # delayed callbacks neither executed nor cancelled
+
+try:
+    _clock = window.performance
+except AttributeError:
+    _clock = window.Date
+
+
+def now():
+    '''Returns the current time in milliseconds'''
+    return _clock.now()
 
-    return timer.set_timeout(lambda: cb(*args, **kwargs), 0)
+
+def _wheel_arm():
+    global _host
+    if not _slots_heap:
+        return
+
+    slot = _slots_heap[0]
+    if _host is not None:
+        if _host[1] <= slot:
+            return  # armed early enough
+
+        timer.clear_timeout(_host[0])
+
+    tout = max(slot * aconfig.timer.resolution - now(), 0)
+    _host = (timer.set_timeout(_wheel_fire, tout), slot)
+
+
+def _wheel_fire():
+    global _host, _live
+    _host = None
+    cur = now() // aconfig.timer.resolution
+
+    # pop all due slots first. Callbacks queued during execution will go to
+    # new slots and be executed in a later host timer
+    due = []
+    while _slots_heap and _slots_heap[0] <= cur:
+        due.append(_slots.pop(heapq.heappop(_slots_heap)))
+
+    error = None
+    for handles in due:
+        for handle in handles:
+            if handle.cancelled:
+                continue
+
+            handle.cancelled = True  # executed, no longer cancellable
+            _live -= 1
+            try:
+                handle.cb()
+            except Exception as e:
+                if error is None:
+                    error = e  # keep 1st, raise when all done
+
+    if _live:
+        _wheel_arm()
+    else:  # only cancelled callbacks left, no need to wake up
+        if _host is not None:
+            timer.clear_timeout(_host[0])
+            _host = None
+
+        _slots.clear()
+        del _slots_heap[:]
+
+    if error is not None:
+        raise error
 
 
 def call_delayed(tout, cb, *args, **kwargs):
-    if not args and not kwargs:
-        return timer.set_timeout(cb, tout)
+    global _live
+    if args or kwargs:
+        cb = (lambda f=cb: f(*args, **kwargs))
+
+    res = aconfig.timer.resolution
+    slot = -(-(now() + tout) // res)  # ceil: never fire before the deadline
+    handle = _Handle(cb, slot)
+    try:
+        _slots[slot].append(handle)
+    except KeyError:
+        _slots[slot] = [handle]
+        heapq.heappush(_slots_heap, slot)
+        _wheel_arm()
 
-    return timer.set_timeout(lambda: cb(*args, **kwargs), tout)
+    _live += 1
+    return handle
+
+
+def live_timers():
+    '''
+    Returns the number of callbacks scheduled with ``call_delayed`` which have
+    neither been executed nor cancelled
+    '''
+    return _live
 
 
 def call_cancel(t):
+    global _live
+    if isinstance(t, _Handle):
+        if not t.cancelled:
+            t.cancelled = True
+            if t.slot is not None:
+                _live -= 1
+
+        return
+
     return timer.clear_timeout(t)
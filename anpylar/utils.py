@@ -61,6 +61,98 @@ class deque(list):
         return self.pop(0)  # remove and return from left
 
 
+class ringbuffer(object):
+    '''
+    Double ended queue over a circular buffer: appending and popping at both
+    ends is *O(1)*, unlike with ``deque`` above which moves all items when
+    removing from the left.
+
+    The buffer doubles its capacity when full. If ``maxlen`` is given, it
+    does not grow beyond it and appending to a full buffer removes the item
+    at the other end
+    '''
+    __slots__ = ('_buf', '_head', '_len', 'maxlen')
+
+    def __init__(self, maxlen=None, capacity=16):
+        self.maxlen = maxlen
+        if maxlen:
+            capacity = min(capacity, maxlen)
+
+        self._buf = [None] * max(capacity, 1)
+        self._head = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        buf, head, size = self._buf, self._head, len(self._buf)
+        for i in range(self._len):
+            yield buf[(head + i) % size]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._len
+
+        if not 0 <= i < self._len:
+            raise IndexError('ringbuffer index out of range')
+
+        return self._buf[(self._head + i) % len(self._buf)]
+
+    def _grow(self):
+        buf, head = self._buf, self._head
+        self._buf = buf[head:] + buf[:head] + [None] * len(buf)
+        self._head = 0
+
+    def _full(self):
+        if self._len < len(self._buf):
+            return False
+
+        if self.maxlen and self._len >= self.maxlen:
+            return True
+
+        self._grow()
+        return False
+
+    def append(self, item):
+        if self._full():
+            self.popleft()
+
+        self._buf[(self._head + self._len) % len(self._buf)] = item
+        self._len += 1
+
+    def appendleft(self, item):
+        if self._full():
+            self.pop()
+
+        self._head = (self._head - 1) % len(self._buf)
+        self._buf[self._head] = item
+        self._len += 1
+
+    def pop(self):
+        if not self._len:
+            raise IndexError('pop from an empty ringbuffer')
+
+        self._len -= 1
+        i = (self._head + self._len) % len(self._buf)
+        item, self._buf[i] = self._buf[i], None  # release the reference
+        return item
+
+    def popleft(self):
+        if not self._len:
+            raise IndexError('pop from an empty ringbuffer')
+
+        i = self._head
+        item, self._buf[i] = self._buf[i], None  # release the reference
+        self._head = (i + 1) % len(self._buf)
+        self._len -= 1
+        return item
+
+    def clear(self):
+        self._buf = [None] * len(self._buf)
+        self._head = self._len = 0
+
+
 # avoid import from heavy lifting operator module
 class operators:
     eq = staticmethod(lambda x, y: x == y)